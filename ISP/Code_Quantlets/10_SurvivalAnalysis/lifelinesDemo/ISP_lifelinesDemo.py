@@ -33,9 +33,9 @@ def main():
     study_duration = 12
     
     # Note: a constant dropout rate is equivalent to an exponential distribution!
-    subsciption_list = [ [exponential(18), exponential(3)][uniform()<0.5] \
-            for i in range(N) ]
-    actual_subscriptiontimes = np.array(subsciption_list)
+    is_short = uniform(size=N) < 0.5
+    actual_subscriptiontimes = np.where(is_short, exponential(3, N),
+                                        exponential(18, N))
     observed_subscriptiontimes = np.minimum(actual_subscriptiontimes,study_duration)
     observed= actual_subscriptiontimes < study_duration
     
@@ -0,0 +1,239 @@
+""" Native survival analysis, for large cohorts
+- Kaplan-Meier survival curves, with Greenwood's variance
+- Log-rank test for two or more groups
+- Vectorized simulation of subscription cohorts
+
+All calculations sort the event times once, and then only use cumulative
+sums; several groups are handled in the same pass.
+"""
+
+# author: Thomas Haslwanter, date: Feb-2021
+
+# Import standard packages
+import numpy as np
+import matplotlib.pyplot as plt
+import pandas as pd
+from scipy import stats
+import os
+
+# additional packages
+import sys
+import time
+from typing import Sequence
+sys.path.append(os.path.join('..', '..', 'Utilities'))
+
+try:
+# Import formatting commands if directory "Utilities" is available
+    from ISP_mystyle import setFonts, showData 
+    
+except ImportError:
+# Ensure correct performance otherwise
+    def setFonts(*options):
+        return
+    def showData(*options):
+        plt.show()
+        return
+
+
+def simulate_cohort(n: int, scales: Sequence[float]=(18, 3),
+                    weights: Sequence[float]=(0.5, 0.5),
+                    study_duration: float=12, rng=None) -> tuple:
+    """Subscription times for a mixture of exponentially distributed
+    groups (a constant dropout rate gives an exponential distribution)
+    
+    Parameters
+    ----------
+    n : number of subjects
+    scales : mean subscription time of each group
+    weights : probability of belonging to each group
+    study_duration : time at which all remaining subjects are censored
+    rng : seed, or numpy random Generator
+    
+    Returns
+    -------
+    times : observed subscription times
+    observed : True if the end of the subscription was observed
+    groups : group index of each subject
+    """
+    
+    rng = np.random.default_rng(rng)
+    groups = rng.choice(len(scales), size=n, p=weights)
+    actual = rng.exponential(np.asarray(scales, dtype=float)[groups])
+    
+    return (np.minimum(actual, study_duration), actual < study_duration,
+            groups)
+
+
+def _group_codes(n: int, groups) -> tuple:
+    """Group labels, and the integer code of each subject"""
+    
+    if groups is None:
+        return (np.zeros(1, dtype=int), np.zeros(n, dtype=int))
+    return np.unique(groups, return_inverse=True)
+
+
+def kaplan_meier(times: np.ndarray, events: np.ndarray, groups=None,
+                 alpha: float=0.05) -> pd.DataFrame:
+    """Kaplan-Meier estimate of the survival function, with Greenwood's
+    variance and "exponential Greenwood" (log-log) confidence intervals
+    
+    Parameters
+    ----------
+    times : event or censoring times
+    events : True for an event, False for a censored observation
+    groups : group label of each subject; each group gets its own curve
+    alpha : significance level of the confidence intervals
+    
+    Returns
+    -------
+    km : one row per distinct time (and group), with the columns 'group',
+         'time', 'at_risk', 'events', 'censored', 'survival', 'variance',
+         'ci_lower', and 'ci_upper'
+    """
+    
+    times = np.asarray(times, dtype=float)
+    events = np.asarray(events, dtype=bool)
+    (labels, codes) = _group_codes(len(times), groups)
+    codes = codes.ravel()
+    
+    # Sort once, by group and time, and find the distinct (group, time)
+    order = np.lexsort((times, codes))
+    (t, e, g) = (times[order], events[order], codes[order])
+    start = np.flatnonzero(np.r_[True, (t[1:] != t[:-1]) |
+                                       (g[1:] != g[:-1])])
+    removed = np.diff(np.r_[start, len(t)])
+    num_events = np.add.reduceat(e.astype(int), start)
+    group = g[start]
+    
+    # subjects at risk: all later entries of the same group
+    group_end = np.cumsum(np.bincount(codes, minlength=len(labels)))
+    at_risk = group_end[group] - (np.cumsum(removed) - removed)
+    
+    # cumulative sums, restarted for each group
+    def group_cumsum(values: np.ndarray) -> np.ndarray:
+        total = np.cumsum(values)
+        first = np.r_[True, group[1:] != group[:-1]]
+        before = (total - values)[first]
+        return total - before[np.cumsum(first) - 1]
+    
+    all_died = num_events == at_risk
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_terms = np.where(all_died, 0,
+                             np.log1p(-num_events/at_risk))
+        greenwood = np.where(all_died, 0,
+                             num_events/(at_risk*(at_risk-num_events)))
+    survival = np.where(group_cumsum(all_died) > 0, 0,
+                        np.exp(group_cumsum(log_terms)))
+    greenwood = group_cumsum(greenwood)
+    
+    # confidence intervals for log(-log(S))
+    z = stats.norm.isf(alpha/2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        se = np.sqrt(greenwood) / np.abs(np.log(survival))
+        ci_lower = survival**np.exp(z*se)
+        ci_upper = survival**np.exp(-z*se)
+    
+    return pd.DataFrame({'group': labels[group], 'time': t[start],
+                         'at_risk': at_risk, 'events': num_events,
+                         'censored': removed - num_events,
+                         'survival': survival,
+                         'variance': survival**2 * greenwood,
+                         'ci_lower': ci_lower, 'ci_upper': ci_upper})
+
+
+def logrank(times: np.ndarray, events: np.ndarray, groups) -> tuple:
+    """Log-rank test for the equality of the survival functions of two or
+    more groups
+    
+    Parameters
+    ----------
+    times : event or censoring times
+    events : True for an event, False for a censored observation
+    groups : group label of each subject
+    
+    Returns
+    -------
+    chi2 : test statistic
+    p : p-value
+    summary : observed and expected number of events in each group
+    """
+    
+    times = np.asarray(times, dtype=float)
+    events = np.asarray(events, dtype=bool)
+    (labels, codes) = _group_codes(len(times), groups)
+    codes = codes.ravel()
+    k = len(labels)
+    
+    # removed subjects and events, for each distinct time and group
+    (unique_times, time_index) = np.unique(times, return_inverse=True)
+    cells = time_index.ravel()*k + codes
+    size = len(unique_times)*k
+    removed = np.bincount(cells, minlength=size).reshape(-1, k)
+    deaths = np.bincount(cells, weights=events,
+                         minlength=size).reshape(-1, k)
+    
+    at_risk = np.sum(removed, axis=0) - np.cumsum(removed, axis=0) + removed
+    (d, n) = (np.sum(deaths, axis=1), np.sum(at_risk, axis=1))
+    
+    observed = np.sum(deaths, axis=0)
+    fraction = at_risk / n[:, np.newaxis]
+    expected = d @ fraction
+    
+    # covariance of (observed - expected), under the null hypothesis
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = np.where(n > 1, d*(n-d)/(n-1), 0)
+    cov = np.diag(factor @ fraction) - (fraction.T * factor) @ fraction
+    
+    difference = (observed - expected)[:-1]
+    chi2 = difference @ np.linalg.solve(cov[:-1, :-1], difference)
+    
+    summary = pd.DataFrame({'observed': observed, 'expected': expected},
+                           index=labels)
+    
+    return (chi2, stats.chi2.sf(chi2, k-1), summary)
+
+
+def main(n: int=10**6) -> tuple:
+    """Survival curves and log-rank test for a simulated subscription
+    cohort, with two types of customers
+    
+    Parameters
+    ----------
+    n : number of subscriptions
+    
+    Returns
+    -------
+    km : Kaplan-Meier curves for the two groups
+    p : p-value of the log-rank test
+    """
+    
+    (times, observed, groups) = simulate_cohort(n, rng=1234)
+    labels = np.array(['long', 'short'])[groups]
+    
+    t_start = time.perf_counter()
+    km = kaplan_meier(times, observed, labels)
+    (chi2, p, summary) = logrank(times, observed, labels)
+    duration = time.perf_counter() - t_start
+    
+    print(f'{n} subscriptions, analyzed in {duration:.2f} sec:')
+    print(summary)
+    print(f'Log-rank test: chi2 = {chi2:.1f}, p = {p:.3g}')
+    
+    # Show the survival curves
+    setFonts(18)
+    for (label, curve) in km.groupby('group'):
+        plt.step(curve.time, curve.survival, where='post', label=label)
+        plt.fill_between(curve.time, curve.ci_lower, curve.ci_upper,
+                         step='post', alpha=0.3)
+    plt.xlabel('time')
+    plt.ylabel('Survival Probability')
+    plt.legend()
+    
+    outFile = 'survival.png'
+    showData(outFile)
+    
+    return (km, p)
+    
+    
+if __name__ == '__main__':
+    main()
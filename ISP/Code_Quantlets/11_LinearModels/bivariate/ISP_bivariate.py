@@ -1,6 +1,8 @@
 """ Analysis of multivariate data
 - Regression line
 - Correlation (Pearson-rho, Spearman-rho, and Kendall-tau)
+- Correlation matrices for many variables
+- Streaming correlations, for data that do not fit into memory
 """
 
 # author: Thomas Haslwanter, date: 2021-01-11
@@ -10,6 +12,11 @@ import numpy as np
 from scipy import stats
 import pandas as pd
 import statsmodels.formula.api as smf
+from typing import Tuple
+
+# additional packages
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
 
 
 def regression_line() -> float:
@@ -70,13 +77,348 @@ def correlation() -> float:
     
     print(corr)    
     
-    # Assert that Spearman's rho is just the correlation of the ranksorted data
+    # Assert that Spearman's rho is just the correlation of the ranksorted
+    # data, and check the matrix versions
     np.testing.assert_almost_equal(corr['spearman'],
             stats.pearsonr(stats.rankdata(x), stats.rankdata(y))[0])
+    for method in ['pearson', 'spearman', 'kendall']:
+        np.testing.assert_almost_equal(corr[method],
+                correlation_matrix(data, method=method)[0, 1])
+    np.testing.assert_almost_equal(corr['pearson'],
+            correlation_file(inFile, chunk_size=5)[0][0, 1])
     
     return corr['pearson']  # should be 0.79208623217849117
     
 
+def rank_columns(data: np.ndarray, method: str='average',
+                 block_size: int=256) -> np.ndarray:
+    """Rank each column of "data" (as "stats.rankdata(data, axis=0)"), with
+    a single sort per column
+    
+    Parameters
+    ----------
+    data : observations in rows, variables in columns
+    method : 'average' (ranks 1...n, ties get their mean rank), or 'dense'
+             (integer ranks 0, 1, ..., without gaps for ties)
+    block_size : number of columns ranked together (limits the memory)
+    
+    Returns
+    -------
+    ranks : ranks, with the same shape as "data"
+    """
+    
+    if method not in ('average', 'dense'):
+        raise ValueError(f'Unknown method: {method}')
+    
+    values = np.asarray(data, dtype=float)
+    (n, k) = values.shape
+    ranks = np.empty((n, k), dtype=float if method == 'average' else np.int64)
+    
+    for first in range(0, k, block_size):
+        # sorting is much faster along contiguous rows
+        block = np.ascontiguousarray(values[:, first:first+block_size].T)
+        order = np.argsort(block, axis=1)
+        ranked = np.take_along_axis(block, order, axis=1)
+        
+        # the first element of each column always starts a new group of ties
+        is_new = np.ones(block.shape, dtype=bool)
+        is_new[:, 1:] = ranked[:, 1:] != ranked[:, :-1]
+        
+        if method == 'dense':
+            sorted_ranks = np.cumsum(is_new, axis=1) - 1
+        else:
+            starts = np.flatnonzero(is_new)
+            ends = np.r_[starts[1:], is_new.size]
+            average = (starts % n + (ends-1) % n) / 2 + 1
+            sorted_ranks = np.repeat(average, ends-starts).reshape(block.shape)
+        
+        block_ranks = np.empty(block.shape, dtype=ranks.dtype)
+        np.put_along_axis(block_ranks, order, sorted_ranks, axis=1)
+        ranks[:, first:first+block_size] = block_ranks.T
+    
+    return ranks
+
+
+def _count_inversions(values: np.ndarray) -> int:
+    """Number of pairs i<j with values[i] > values[j], with a bottom-up merge
+    sort. At each level, the elements of every right block are located in
+    the sorted left block of the same pair with one "searchsorted"; the
+    stable sort then merges the two sorted runs of each pair in linear time.
+    
+    Parameters
+    ----------
+    values : non-negative integers (e.g. dense ranks)
+    
+    Returns
+    -------
+    inversions : number of discordant pairs
+    """
+    
+    n = len(values)
+    values = np.asarray(values, dtype=np.int64)
+    size = np.int64(np.max(values, initial=0) + 1)
+    position = np.arange(n)
+    inversions = 0
+    
+    width = 1
+    while width < n:
+        pair = position // (2*width)
+        keys = pair*size + values
+        is_right = (position // width) % 2 == 1
+        (left, right) = (keys[~is_right], keys[is_right])
+        right_pair = pair[is_right]
+        
+        # left elements of the same pair that are larger than each right one
+        left_end = np.searchsorted(left, (right_pair+1)*size)
+        inversions += np.sum(left_end -
+                             np.searchsorted(left, right, side='right'))
+        
+        values = np.sort(keys, kind='stable') - pair*size
+        width *= 2
+    
+    return int(inversions)
+
+
+def _tie_pairs(keys: np.ndarray) -> int:
+    """Number of tied pairs, for sorted keys"""
+    
+    counts = np.diff(np.flatnonzero(np.r_[True, keys[1:] != keys[:-1],
+                                          True]))
+    return int(np.sum(counts*(counts-1)//2))
+
+
+def _kendall_pair(x_rank: np.ndarray, y_rank: np.ndarray, x_ties: int,
+                  y_ties: int) -> float:
+    """Kendall's tau-b for two columns of dense ranks (Knight's algorithm)"""
+    
+    n = len(x_rank)
+    # sort by x, and by y within ties of x
+    keys = np.sort(x_rank*np.int64(y_rank.max()+1) + y_rank, kind='stable')
+    joint_ties = _tie_pairs(keys)
+    discordant = _count_inversions(keys % (y_rank.max()+1))
+    
+    total = n*(n-1)//2
+    numerator = total - x_ties - y_ties + joint_ties - 2*discordant
+    return numerator / np.sqrt(float(total-x_ties) * float(total-y_ties))
+
+
+def kendall_tau(x: np.ndarray, y: np.ndarray) -> float:
+    """Kendall's tau-b in O(n log(n)), with a merge-sort count of the
+    discordant pairs (as "stats.kendalltau")
+    
+    Parameters
+    ----------
+    x, y : paired data
+    
+    Returns
+    -------
+    tau : Kendall's tau-b
+    """
+    
+    ranks = rank_columns(np.column_stack((x, y)), method='dense')
+    ties = [_tie_pairs(np.sort(column)) for column in ranks.T]
+    
+    return _kendall_pair(ranks[:, 0], ranks[:, 1], *ties)
+
+
+def correlation_matrix(data: np.ndarray, method: str='pearson',
+                       block_size: int=512, n_jobs: int=1) -> np.ndarray:
+    """Correlation matrix for all columns of "data"
+    
+    Each column is ranked only once. Pearson and Spearman correlations are
+    computed as matrix products of blocks of standardized columns; Kendall's
+    tau-b is computed for each pair of columns with a merge-sort count of the
+    discordant pairs, distributed over "n_jobs" threads.
+    
+    Parameters
+    ----------
+    data : observations in rows, variables in columns
+    method : 'pearson', 'spearman', or 'kendall'
+    block_size : number of columns per block, for the matrix products
+    n_jobs : number of threads for the Kendall correlations
+    
+    Returns
+    -------
+    corr : correlation matrix; a DataFrame if "data" is a DataFrame
+    """
+    
+    values = np.asarray(data, dtype=float)
+    (n, k) = values.shape
+    
+    if method == 'kendall':
+        ranks = rank_columns(values, method='dense')
+        ties = [_tie_pairs(np.sort(column)) for column in ranks.T]
+        pairs = list(combinations(range(k), 2))
+        kendall = lambda pair: _kendall_pair(ranks[:, pair[0]],
+                ranks[:, pair[1]], ties[pair[0]], ties[pair[1]])
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            taus = list(executor.map(kendall, pairs))
+        
+        corr = np.eye(k)
+        if pairs:
+            (rows, cols) = np.array(pairs).T
+            corr[rows, cols] = corr[cols, rows] = taus
+    elif method in ('pearson', 'spearman'):
+        if method == 'spearman':
+            values = rank_columns(values)
+        
+        def standardized(start: int) -> np.ndarray:
+            block = values[:, start:start+block_size]
+            block = block - np.mean(block, axis=0)
+            return block / np.linalg.norm(block, axis=0)
+        
+        corr = np.empty((k, k))
+        for row in range(0, k, block_size):
+            row_block = standardized(row)
+            for col in range(row, k, block_size):
+                col_block = row_block if col == row else standardized(col)
+                product = row_block.T @ col_block
+                corr[row:row+block_size, col:col+block_size] = product
+                corr[col:col+block_size, row:row+block_size] = product.T
+        np.fill_diagonal(corr, 1.)
+    else:
+        raise ValueError(f'Unknown method: {method}')
+    
+    if isinstance(data, pd.DataFrame):
+        corr = pd.DataFrame(corr, index=data.columns, columns=data.columns)
+    
+    return corr
+    
+
+
+class CorrelationAccumulator:
+    """ Running co-moments for Pearson correlation matrices
+    
+    Only the number of samples, the column means, and the matrix of centered
+    sums of squares and cross-products are kept, so memory stays constant
+    regardless of the number of rows. Chunks are combined with the pairwise
+    update formulas of Chan et al.; the same formulas are used to merge
+    accumulators that have been filled by different workers.
+    
+    n : number of samples
+    mean : column means
+    C : centered sums of squares and cross-products
+    
+    """
+
+    def __init__(self):
+        """Constructor"""
+        self.n = 0
+        self.mean = None
+        self.C = None
+    
+    
+    def _combine(self, n: int, mean: np.ndarray, C: np.ndarray) -> None:
+        """Add the co-moments from another set of samples"""
+        
+        if n == 0:
+            return
+        
+        if self.n == 0:
+            (self.n, self.mean, self.C) = (n, mean.copy(), C.copy())
+            return
+        
+        n_total = self.n + n
+        delta = mean - self.mean
+        
+        self.mean += delta * n/n_total
+        self.C += C + np.outer(delta, delta) * self.n*n/n_total
+        self.n = n_total
+        
+        
+    def update(self, chunk: np.ndarray) -> 'CorrelationAccumulator':
+        """Add a chunk of rows. Rows containing a NaN are ignored.
+        
+        Parameters
+        ----------
+        chunk : observations in rows, variables in columns
+        
+        Returns
+        -------
+        self : the updated accumulator
+        """
+        
+        chunk = np.asarray(chunk, dtype=float)
+        chunk = chunk[~np.any(np.isnan(chunk), axis=1)]
+        
+        n = len(chunk)
+        if n == 0:
+            return self
+        
+        mean = np.mean(chunk, axis=0)
+        centered = chunk - mean
+        self._combine(n, mean, centered.T @ centered)
+        
+        return self
+    
+    
+    def merge(self, other: 'CorrelationAccumulator'
+              ) -> 'CorrelationAccumulator':
+        """Merge the co-moments of another accumulator into this one
+        
+        Parameters
+        ----------
+        other : accumulator, e.g. from a different worker
+        
+        Returns
+        -------
+        self : the updated accumulator
+        """
+        
+        self._combine(other.n, other.mean, other.C)
+        return self
+    
+    
+    def pearson(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Pearson correlation matrix, and the corresponding p-values
+        
+        Returns
+        -------
+        r : Pearson correlation coefficients
+        p : two-sided p-values, for the hypothesis of no correlation
+        """
+        
+        n = self.n
+        if n < 3:
+            raise ValueError(f'At least 3 data points are required, not {n}')
+        
+        sd = np.sqrt(np.diag(self.C))
+        r = np.clip(self.C / np.outer(sd, sd), -1, 1)
+        np.fill_diagonal(r, 1.)
+        
+        # t-test with n-2 degrees of freedom, as in "stats.pearsonr"
+        with np.errstate(divide='ignore'):
+            t = r * np.sqrt((n-2) / (1-r**2))
+        p = 2 * stats.t.sf(np.abs(t), n-2)
+        
+        return (r, p)
+    
+    
+def correlation_file(inFile: str, chunk_size: int=100000,
+                     delimiter: str=',') -> Tuple[np.ndarray, np.ndarray]:
+    """Pearson correlation matrix of the columns of a text file, which is
+    read in chunks of rows
+    
+    Parameters
+    ----------
+    inFile : name of a delimited text file without header
+    chunk_size : number of rows read at a time
+    delimiter : column separator
+    
+    Returns
+    -------
+    r : Pearson correlation coefficients
+    p : two-sided p-values
+    """
+    
+    accumulator = CorrelationAccumulator()
+    for chunk in pd.read_csv(inFile, header=None, sep=delimiter,
+                             chunksize=chunk_size):
+        accumulator.update(chunk.values)
+        
+    return accumulator.pearson()
+    
+
 if __name__ == '__main__':
     regression_line()    
     correlation()
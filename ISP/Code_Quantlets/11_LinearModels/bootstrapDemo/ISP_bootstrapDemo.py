@@ -1,24 +1,28 @@
 """ Example of bootstrapping the confidence interval for the mean
-This function requires "bootstrap.py", which is available from
-https://github.com/cgevans/scikits-bootstrap
+The bootstrap is implemented here with numpy: the resamples are generated
+as blocks of indices, and the statistic is evaluated for a whole block
+at once. This gives the same results as "scikits.bootstrap"
+(https://github.com/cgevans/scikits-bootstrap), much faster.
+For expensive statistics, the blocks can be distributed over a pool of
+processes ("n_jobs"). Every block has its own random generator, so the
+results do not depend on the number of processes.
 """
 
 # author: Thomas Haslwanter, date: Feb-2021
 
 # Import standard packages
+import numpy as np
 import matplotlib.pyplot as plt
-import scipy as sp
 from scipy import stats
-
-# additional packages
-import scikits.bootstrap as bootstrap
+from typing import Callable
+from concurrent.futures import ProcessPoolExecutor
 
 
 def generate_data():
     """ Generate the data for the bootstrap simulation """
     
     # To get reproducable values, I provide a seed value
-    sp.random.seed(987654321)   
+    np.random.seed(987654321)   
     
     # Generate a non-normally distributed datasample
     data = stats.poisson.rvs(2, size=1000)
@@ -37,7 +41,7 @@ def calc_bootstrap(data):
     
     # --- >>> START stats <<< ---
     # Calculate the bootstrap
-    CIs = bootstrap.ci(data=data, statfunction=sp.mean)
+    CIs = bootstrap_ci(data=data, statfunction=np.mean, rng=987654321)
     # --- >>> STOP stats <<< ---
     
     # Print the data: the "*" turns the array "CIs" into a list
@@ -46,6 +50,184 @@ def calc_bootstrap(data):
     return CIs
 
 
+def _evaluate(statfunction: Callable, samples: np.ndarray,
+              vectorized: bool) -> np.ndarray:
+    """ Apply the statistic to each row of "samples" """
+    
+    if vectorized:
+        return statfunction(samples, axis=-1)
+    else:
+        return np.apply_along_axis(statfunction, -1, samples)
+    
+
+def _seed_sequence(rng) -> np.random.SeedSequence:
+    """ Root SeedSequence, from a seed or from a numpy random Generator """
+    
+    if isinstance(rng, np.random.SeedSequence):
+        return rng
+    if isinstance(rng, np.random.Generator):
+        return np.random.SeedSequence(rng.integers(2**63))
+    return np.random.SeedSequence(rng)
+    
+
+# Data for the worker processes, set once per process by "_init_worker"
+_worker_args = {}
+
+def _init_worker(data: np.ndarray, statfunction: Callable,
+                 vectorized: bool) -> None:
+    """ Store the data in the worker process, so that they have to be
+    transferred only once and not for every block """
+    
+    _worker_args.update(data=data, statfunction=statfunction,
+                        vectorized=vectorized)
+    
+
+def _bootstrap_block(task: tuple) -> np.ndarray:
+    """ Statistic for one block of resamples, with its own generator """
+    
+    (num, seed) = task
+    data = _worker_args['data']
+    
+    rng = np.random.default_rng(seed)
+    index = rng.integers(0, len(data), size=(num, len(data)))
+    
+    return _evaluate(_worker_args['statfunction'], data[index],
+                     _worker_args['vectorized'])
+    
+
+def bootstrap_distribution(data: np.ndarray, statfunction: Callable=np.mean,
+                           n_samples: int=10000, vectorized: bool=True,
+                           chunk_size: int=None, rng=None,
+                           n_jobs: int=1) -> np.ndarray:
+    """ Bootstrap distribution of a statistic
+    
+    Parameters
+    ----------
+    data : data sample (vector)
+    statfunction : statistic. If "vectorized" is True, it has to accept
+                   an "axis" argument, like np.mean or np.median
+    n_samples : number of bootstrap samples
+    vectorized : if False, "statfunction" is called for each resample
+    chunk_size : number of resamples that are generated at once. By default
+                 this is chosen so that a chunk takes about 4 MB
+    rng : seed, SeedSequence, or numpy random Generator. Each chunk gets
+          its own generator, spawned from this seed
+    n_jobs : number of worker processes. For n_jobs>1, "statfunction" has to
+             be picklable, i.e. defined at the top level of a module
+    
+    Returns
+    -------
+    boot_stats : statistic for each bootstrap sample. For a given seed and
+                 chunk_size, they are identical for any value of n_jobs
+    """
+    
+    data = np.asarray(data)
+    n = len(data)
+    
+    if chunk_size is None:
+        chunk_size = max(1, 2**19 // n)
+    
+    sizes = [min(chunk_size, n_samples-first)
+             for first in range(0, n_samples, chunk_size)]
+    seeds = _seed_sequence(rng).spawn(len(sizes))
+    tasks = list(zip(sizes, seeds))
+    
+    if n_jobs == 1:
+        _init_worker(data, statfunction, vectorized)
+        blocks = [_bootstrap_block(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                    initargs=(data, statfunction, vectorized)) as executor:
+            blocks = list(executor.map(_bootstrap_block, tasks))
+    
+    return np.concatenate(blocks)
+    
+
+def _jackknife(data: np.ndarray, statfunction: Callable, vectorized: bool,
+               chunk_size: int) -> np.ndarray:
+    """ Statistic for each leave-one-out sample """
+    
+    n = len(data)
+    base = np.arange(n-1)
+    
+    jack_stats = np.empty(n)
+    for first in range(0, n, chunk_size):
+        left_out = np.arange(first, min(first+chunk_size, n))
+        # row i contains all indices except "left_out[i]"
+        index = base + (base >= left_out[:, np.newaxis])
+        jack_stats[left_out] = _evaluate(statfunction, data[index], vectorized)
+    
+    return jack_stats
+    
+
+def bootstrap_ci(data: np.ndarray, statfunction: Callable=np.mean,
+                 alpha: float=0.05, n_samples: int=10000, method: str='bca',
+                 vectorized: bool=True, chunk_size: int=None,
+                 rng=None, n_jobs: int=1) -> np.ndarray:
+    """ Bootstrap confidence interval for a statistic
+    
+    Parameters
+    ----------
+    data : data sample (vector)
+    statfunction : statistic. If "vectorized" is True, it has to accept
+                   an "axis" argument, like np.mean or np.median
+    alpha : confidence limit [default=0.05]
+    n_samples : number of bootstrap samples
+    method : 'percentile', 'basic', or 'bca' (bias-corrected and
+             accelerated) [default]
+    vectorized : if False, "statfunction" is called for each resample
+    chunk_size : number of resamples that are generated at once. By default
+                 this is chosen so that a chunk takes about 4 MB
+    rng : seed, SeedSequence, or numpy random Generator
+    n_jobs : number of worker processes (see "bootstrap_distribution")
+    
+    Returns
+    -------
+    CIs : lower and upper confidence limit
+    """
+    
+    data = np.asarray(data)
+    if chunk_size is None:
+        chunk_size = max(1, 2**19 // len(data))
+    
+    boot_stats = bootstrap_distribution(data, statfunction, n_samples,
+                                        vectorized, chunk_size, rng, n_jobs)
+    limits = np.array([alpha/2, 1-alpha/2])
+    
+    if method == 'percentile':
+        return np.quantile(boot_stats, limits)
+    
+    stat = _evaluate(statfunction, data, vectorized)
+    
+    if method == 'basic':
+        return 2*stat - np.quantile(boot_stats, limits[::-1])
+    
+    if method != 'bca':
+        raise ValueError(f'Unknown method: {method}')
+    
+    # Bias correction. Ties count half, for statistics of discrete data
+    z0 = stats.norm.ppf(np.mean(boot_stats < stat) +
+                        np.mean(boot_stats == stat)/2)
+    if not np.isfinite(z0):
+        raise ValueError('All bootstrap values lie on one side of the ' +
+                         'statistic: use method="percentile"')
+    
+    # Acceleration, from the jackknife
+    jack_stats = _jackknife(data, statfunction, vectorized, chunk_size)
+    deviations = np.mean(jack_stats) - jack_stats
+    ss_jack = np.sum(deviations**2)
+    if ss_jack > 0:
+        accel = np.sum(deviations**3) / (6 * ss_jack**1.5)
+    else:
+        # e.g. the median of data with many ties
+        accel = 0.
+    
+    zs = z0 + stats.norm.ppf(limits)
+    adjusted = stats.norm.cdf(z0 + zs/(1-accel*zs))
+    
+    return np.quantile(boot_stats, adjusted)
+
+
 if __name__ == '__main__':
     data = generate_data()
     calc_bootstrap(data)
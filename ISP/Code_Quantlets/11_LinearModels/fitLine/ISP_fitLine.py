@@ -40,6 +40,21 @@ Examples
 >>> y = x**2
 >>> (a,b,(ci_a, ci_b),_)=fitLine(x,y)    
 
+For many series at once, without printing or plotting:
+
+>>> from fitLine import fitLine_batch
+>>> xs = np.tile(x, (1000,1))
+>>> ys = xs**2 + np.random.randn(*xs.shape)
+>>> (a,b,(ci_a, ci_b),info) = fitLine_batch(xs, ys)
+
+For data that do not fit into memory, feed them chunk by chunk:
+
+>>> from fitLine import LineFitAccumulator
+>>> acc = LineFitAccumulator()
+>>> for (x_chunk, y_chunk) in chunks:
+>>>     acc.update(x_chunk, y_chunk)
+>>> (a,b,(ci_a, ci_b),info) = acc.fit()
+
 Notes
 -----
 Example data and formulas are taken from
@@ -52,6 +67,7 @@ D. Altman, "Practical Statistics for Medicine"
 import numpy as np
 import matplotlib.pyplot as plt
 import scipy.stats as stats
+from typing import Tuple, Iterable
 
 
 def fitLine(x, y, alpha=0.05, newx=[], plotFlag=1):
@@ -173,6 +189,311 @@ def fitLine(x, y, alpha=0.05, newx=[], plotFlag=1):
     else:
         return (a,b,(ci_a, ci_b), ri)
     
+
+def fitLine_batch(x: np.ndarray, y: np.ndarray, alpha: float=0.05
+                  ) -> Tuple[np.ndarray, np.ndarray, Tuple, dict]:
+    """ Vectorized version of "fitLine", for many series at once
+    
+    Each row of "x" and "y" is one series. Samples where "x" or "y" is NaN
+    are ignored, so series of different length can be padded with NaNs.
+    Nothing is printed or plotted.
+    
+    Parameters
+    ----------
+    x : ndarray, shape (n_series, n_points) or (n_points,)
+        Input / Predictor. A 1-D array is shared by all series.
+    y : ndarray, shape (n_series, n_points)
+        Input / Estimator
+    alpha : float
+        Confidence limit [default=0.05]
+    
+    Returns
+    -------
+    a : ndarray, shape (n_series,)
+        Intercepts
+    b : ndarray, shape (n_series,)
+        Slopes
+    ci : tuple(ndarray, ndarray)
+        Lower and upper confidence intervals for intercepts and slopes,
+        each with shape (n_series, 2)
+    info : dictionary, containing arrays with
+        - n
+        - var_res
+        - sd_res
+        - se_a
+        - se_b
+        - tval
+        - df
+        and the scalar "alpha". For series with only 2 valid points, the
+        intercept and slope are exact, but the residual variance, standard
+        errors, t-values and confidence intervals are NaN; with fewer than
+        2 valid points, all outputs are NaN.
+    """
+    
+    (x, y) = np.broadcast_arrays(np.atleast_2d(np.asarray(x, dtype=float)),
+                                 np.atleast_2d(np.asarray(y, dtype=float)))
+    
+    # Mask the missing data, and set them to zero
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x = np.where(valid, x, 0.)
+    y = np.where(valid, y, 0.)
+    n = valid.sum(axis=1)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Summary data, from centered values for numerical stability
+        mean_x = x.sum(axis=1)/n
+        mean_y = y.sum(axis=1)/n
+        sum_x2 = np.einsum('ij,ij->i', x, x)
+        
+        dx = x - mean_x[:, np.newaxis]
+        dx *= valid
+        dy = y                              # re-use the memory
+        dy -= mean_y[:, np.newaxis]
+        dy *= valid
+        
+        Sxx = np.einsum('ij,ij->i', dx, dx)
+        Sxy = np.einsum('ij,ij->i', dx, dy)
+        
+        # Linefit
+        b = Sxy/Sxx
+        a = mean_y - b*mean_x
+        
+        # Residuals
+        dx *= b[:, np.newaxis]
+        residuals = dy - dx
+        df = n-2                            # degrees of freedom
+        var_res = np.einsum('ij,ij->i', residuals, residuals)/df
+        var_res[df<1] = np.nan
+        sd_res = np.sqrt(var_res)
+        
+        # Confidence intervals
+        se_b = sd_res/np.sqrt(Sxx)
+        se_a = sd_res*np.sqrt(sum_x2/(n*Sxx))
+    
+    # The t-values only depend on df: calculate each one only once
+    tval = np.full(len(n), np.nan)
+    good = df >= 1
+    (df_unique, df_index) = np.unique(df[good], return_inverse=True)
+    tval[good] = stats.t.isf(alpha/2., df_unique)[df_index]
+    
+    ci_a = a[:, np.newaxis] + (tval*se_a)[:, np.newaxis]*np.array([-1, 1])
+    ci_b = b[:, np.newaxis] + (tval*se_b)[:, np.newaxis]*np.array([-1, 1])
+    
+    # Return info
+    ri = {'n': n,
+        'var_res': var_res,
+        'sd_res': sd_res,
+        'se_a': se_a,
+        'se_b': se_b,
+        'alpha': alpha,
+        'tval': tval,
+        'df': df}
+    
+    return (a, b, (ci_a, ci_b), ri)
+
+
+class LineFitAccumulator:
+    """ Running sufficient statistics for "fitLine"
+    
+    Only the number of samples, the means, and the centered sums of squares
+    and cross-products are kept, so memory stays constant regardless of the
+    amount of data. Chunks are combined with the pairwise update formulas
+    of Chan et al., which are numerically stable; the same formulas are used
+    to merge accumulators that have been filled by different workers.
+    
+    n : number of samples
+    mean_x, mean_y : means of x and y
+    Sxx, Syy, Sxy : centered sums of squares and cross-products
+    
+    """
+
+    def __init__(self):
+        """Constructor"""
+        self.n = 0
+        self.mean_x = 0.
+        self.mean_y = 0.
+        self.Sxx = 0.
+        self.Syy = 0.
+        self.Sxy = 0.
+    
+    
+    def _combine(self, n: int, mean_x: float, mean_y: float,
+                 Sxx: float, Syy: float, Sxy: float) -> None:
+        """Add the statistics from another set of samples"""
+        
+        if n == 0:
+            return
+        
+        n_total = self.n + n
+        delta_x = mean_x - self.mean_x
+        delta_y = mean_y - self.mean_y
+        weight = self.n * n / n_total
+        
+        self.mean_x += delta_x * n/n_total
+        self.mean_y += delta_y * n/n_total
+        self.Sxx += Sxx + delta_x**2 * weight
+        self.Syy += Syy + delta_y**2 * weight
+        self.Sxy += Sxy + delta_x*delta_y * weight
+        self.n = n_total
+        
+        
+    def update(self, x: np.ndarray, y: np.ndarray) -> 'LineFitAccumulator':
+        """Add a chunk of data. Pairs containing a NaN are ignored.
+        
+        Parameters
+        ----------
+        x : Input / Predictor
+        y : Input / Estimator
+        
+        Returns
+        -------
+        self : the updated accumulator
+        """
+        
+        x = np.ravel(np.asarray(x, dtype=float))
+        y = np.ravel(np.asarray(y, dtype=float))
+        goodIndex = np.invert(np.logical_or(np.isnan(x), np.isnan(y)))
+        x = x[goodIndex]
+        y = y[goodIndex]
+        
+        n = len(x)
+        if n == 0:
+            return self
+        
+        mean_x = np.mean(x)
+        mean_y = np.mean(y)
+        dx = x - mean_x
+        dy = y - mean_y
+        self._combine(n, mean_x, mean_y,
+                      np.dot(dx, dx), np.dot(dy, dy), np.dot(dx, dy))
+        
+        return self
+    
+    
+    def merge(self, other: 'LineFitAccumulator') -> 'LineFitAccumulator':
+        """Merge the statistics of another accumulator into this one
+        
+        Parameters
+        ----------
+        other : accumulator, e.g. from a different worker
+        
+        Returns
+        -------
+        self : the updated accumulator
+        """
+        
+        self._combine(other.n, other.mean_x, other.mean_y,
+                      other.Sxx, other.Syy, other.Sxy)
+        return self
+    
+    
+    def fit(self, alpha: float=0.05, newx: np.ndarray=None) -> Tuple:
+        """Line fit, with the same formulas as "fitLine"
+        
+        Parameters
+        ----------
+        alpha : Confidence limit [default=0.05]
+        newx : Values for which the fit and the prediction limits are
+               calculated (optional)
+        
+        Returns
+        -------
+        a : Intercept
+        b : Slope
+        ci : Lower and upper confidence interval for intercept and slope
+        info : dictionary, with the same entries as for "fitLine", except
+               for the residuals (which are not kept)
+        newy : Predictions for (newx, newx-ciPrediction, newx+ciPrediction),
+               only if "newx" is given
+        """
+        
+        n = self.n
+        if n < 3:
+            raise ValueError(f'At least 3 data points are required, not {n}')
+        
+        # Linefit
+        b = self.Sxy/self.Sxx
+        a = self.mean_y - b*self.mean_x
+        
+        # Residuals: Syy - b*Sxy is the residual sum of squares
+        var_res = max(self.Syy - b*self.Sxy, 0.)/(n-2)
+        sd_res = np.sqrt(var_res)
+        
+        # Confidence intervals
+        sum_x2 = self.Sxx + n*self.mean_x**2
+        se_b = sd_res/np.sqrt(self.Sxx)
+        se_a = sd_res*np.sqrt(sum_x2/(n*self.Sxx))
+        
+        df = n-2                            # degrees of freedom
+        tval = stats.t.isf(alpha/2., df) 	# appropriate t value
+        
+        ci_a = a + tval*se_a*np.array([-1,1])
+        ci_b = b + tval*se_b*np.array([-1,1])
+        
+        # Return info
+        ri = {'var_res': var_res,
+            'sd_res': sd_res,
+            'alpha': alpha,
+            'tval': tval,
+            'df': df}
+        
+        if newx is None:
+            return (a,b,(ci_a, ci_b), ri)
+        
+        newx = np.atleast_1d(np.asarray(newx, dtype=float))
+        se_predict = sd_res * np.sqrt(1+1./n + (newx-self.mean_x)**2/self.Sxx)
+        fit = a + b*newx
+        newy = (fit, fit - se_predict, fit + se_predict)
+        return (a,b,(ci_a, ci_b), ri, newy)
+    
+    
+    def bands(self, newx: np.ndarray, alpha: float=0.05
+              ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Confidence and prediction bands, as plotted by "fitLine"
+        
+        Parameters
+        ----------
+        newx : x-values for the bands
+        alpha : Confidence limit [default=0.05]
+        
+        Returns
+        -------
+        fit : fitted values at "newx"
+        ci_fit : half-width of the confidence band
+        ci_predict : half-width of the prediction band
+        """
+        
+        (a, b, _, ri) = self.fit(alpha)
+        newx = np.asarray(newx, dtype=float)
+        n = self.n
+        
+        se_fit     = ri['sd_res'] * np.sqrt(  1./n +
+                                        (newx-self.mean_x)**2/self.Sxx)
+        se_predict = ri['sd_res'] * np.sqrt(1+1./n +
+                                        (newx-self.mean_x)**2/self.Sxx)
+        
+        return (a + b*newx, ri['tval']*se_fit, ri['tval']*se_predict)
+
+
+def fitLine_stream(chunks: Iterable, alpha: float=0.05) -> Tuple:
+    """ Line fit for data that arrive in chunks, with constant memory
+    
+    Parameters
+    ----------
+    chunks : iterable of (x, y) tuples, e.g. a generator reading a file
+    alpha : Confidence limit [default=0.05]
+    
+    Returns
+    -------
+    Same as "LineFitAccumulator.fit"
+    """
+    
+    acc = LineFitAccumulator()
+    for (x, y) in chunks:
+        acc.update(x, y)
+    
+    return acc.fit(alpha)
+    
     
 if __name__ == '__main__':
         # example data
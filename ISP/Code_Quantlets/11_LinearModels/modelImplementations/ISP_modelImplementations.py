@@ -2,6 +2,7 @@
 - analytically
 - using the statsmodels tools
 - using the formula-based approach
+- nested models from a single QR-decomposition
 """
 
 # author: Thomas Haslwanter, date: Feb-2021
@@ -9,6 +10,8 @@
 # Import standard packages
 import numpy as np
 import matplotlib.pyplot as plt
+import pandas as pd
+from scipy import linalg, stats
 import os
 
 # additional packages
@@ -79,9 +82,68 @@ def analyticalSolution(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray,
     print('The coefficients from the quadratic fit: {0}'.format(p2[0]))
     print('The coefficients from the cubic fit: {0}'.format(p3[0]))
     
+    # Since the models are nested, all three fits can also be obtained from
+    # a single QR-decomposition of the largest design matrix
+    (params, _, anova) = nestedFits(M3, y, n_params=(2, 3, 4))
+    for (p_lstsq, p_qr) in zip((p1, p2, p3), params):
+        np.testing.assert_allclose(p_lstsq[0], p_qr)
+    print(anova)
+    
     return (M1, M2, M3)
 
 
+def nestedFits(M: np.ndarray, y: np.ndarray, n_params: Tuple[int, ...]
+               ) -> Tuple[list, list, pd.DataFrame]:
+    """Least-squares fits of nested models, from a single QR-decomposition
+    
+    The models use the first "n_params" columns of the design matrix "M".
+    Only the triangular factor R of [M, y] is computed: the fit of a model
+    with k parameters only involves the leading k x k block of R, and the
+    residual sum of squares is the squared norm of the remaining elements of
+    the last column (i.e. of Q.T @ y). Q itself is never formed.
+    
+    Parameters
+    ----------
+    M : design matrix of the largest model
+    y : data
+    n_params : number of (leading) columns of M in each model, increasing
+    
+    Returns
+    -------
+    params : list with the parameters of each model
+    bse : list with the corresponding standard errors
+    anova : ANOVA-table for the sequence of models, with the same columns as
+            "statsmodels.stats.anova_lm"
+    """
+    
+    (n, p) = M.shape
+    R = np.linalg.qr(np.column_stack((M, y)), mode='r')
+    qty = R[:, p]
+    
+    # The leading k x k block of inv(R) is the inverse of R[:k, :k]
+    R_inv = linalg.solve_triangular(R[:p, :p], np.eye(p))
+    
+    (params, bse, ssr) = ([], [], [])
+    for k in n_params:
+        params.append(linalg.solve_triangular(R[:k, :k], qty[:k]))
+        ssr.append(np.sum(qty[k:]**2))
+        scale = ssr[-1] / (n-k)
+        bse.append(np.sqrt(scale * np.sum(R_inv[:k, :k]**2, axis=1)))
+    
+    # F-tests of each model against the previous one; as in "anova_lm", the
+    # residual variance is taken from the largest model
+    df_resid = n - np.array(n_params)
+    ssr = np.array(ssr)
+    df_diff = np.r_[np.nan, -np.diff(df_resid)]
+    ss_diff = np.r_[np.nan, -np.diff(ssr)]
+    F = ss_diff / df_diff / (ssr[-1] / df_resid[-1])
+    anova = pd.DataFrame({'df_resid': df_resid, 'ssr': ssr,
+                          'df_diff': df_diff, 'ss_diff': ss_diff, 'F': F,
+                          'Pr(>F)': stats.f.sf(F, df_diff, df_resid[-1])})
+    
+    return (params, bse, anova)
+    
+    
 def smSolution(M1, M2, M3) -> None:
     """Solution with the tools from statsmodels
     Input:  design matrices for linear quadratic, and cubic fit
@@ -2,6 +2,7 @@
 
 - "model_formulas" is based on examples in Kaplan's book "Statistical Modeling".
 - "polynomial_regression" shows how to work with simple design matrices
+- "ols_by_group" fits the same formula model to many groups at once
 """
 
 # author: Thomas Haslwanter, date: Feb-2021
@@ -14,7 +15,9 @@ import pandas as pd
 from statsmodels.formula.api import ols
 import statsmodels.regression.linear_model as sm
 from statsmodels.stats.anova import anova_lm
-from typing import List
+from patsy import dmatrices
+from scipy import stats
+from typing import List, Tuple
 
 
 def model_formulas() -> float:
@@ -50,6 +53,11 @@ def model_formulas() -> float:
     model3Results = anova_lm(model3)
     print(model3Results)
     
+    # The same model, fitted separately for men and women
+    (coefs, fits) = ols_by_group('time ~ year', data, group='sex')
+    print(coefs)
+    print(fits)
+    
     # Just to check the correct run
     return model3Results['F'][0] # should be 156.1407931415788
     
@@ -88,6 +96,125 @@ def polynomial_regression() -> List[float]:
     return res.params # should be [ 4.74244177,  2.60675788,  2.03793634]
 
 
+def ols_by_group(formula: str, data: pd.DataFrame, group: str
+                 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """ Fit the same OLS-model separately for each group in "data"
+    
+    The formula is parsed, and the design matrix built, only once for the
+    whole DataFrame. Within each group the predictors are centered (if the
+    model has an intercept) and scaled, the cross-products are summed over
+    the rows sorted by group, and all the least-squares problems are solved
+    with a single batched "np.linalg.solve". Groups whose design matrix does
+    not have full rank (e.g. too few rows, or a missing factor level) get
+    NaNs.
+    
+    Parameters
+    ----------
+    formula : model, e.g. 'time ~ sex + year'
+    data : data for all groups
+    group : name of the column that defines the groups
+    
+    Returns
+    -------
+    coefs : coefficients ('coef', 'std err', 't', 'P>|t|') for each
+            (group, term), as in the summary of "ols(...).fit()"
+    fits : for each group the number of observations, the residual degrees
+           of freedom, R^2, and the F-test of the whole model
+    """
+    
+    # Design matrix for all groups, and the group of each row. String
+    # columns are converted to categoricals, since patsy handles those much
+    # faster (and with the same sorted levels).
+    data = data.apply(lambda column: column.astype('category')
+                      if pd.api.types.is_string_dtype(column) else column)
+    (y, X) = dmatrices(formula, data, NA_action='drop',
+                       return_type='dataframe')
+    (codes, labels) = pd.factorize(data.loc[X.index, group], sort=True)
+    names = list(X.columns)
+    has_const = 'Intercept' in names
+    predictors = [name for name in names if name != 'Intercept']
+    
+    # Sort the rows by group
+    valid_rows = codes >= 0
+    order = np.argsort(codes[valid_rows], kind='stable')
+    codes = codes[valid_rows][order]
+    x = X[predictors].values[valid_rows][order]
+    y = y.values[valid_rows, 0][order]
+    
+    n_groups = len(labels)
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    (p, q) = (len(names), len(predictors))
+    
+    def group_sums(values: np.ndarray) -> np.ndarray:
+        """Sum over the rows of each group (also for empty groups)"""
+        sums = np.zeros((n_groups,) + values.shape[1:])
+        present = counts > 0
+        sums[present] = np.add.reduceat(values, starts[present], axis=0)
+        return sums
+    
+    # Center and scale within each group
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if has_const:
+            x_mean = group_sums(x) / counts[:, None]
+            y_mean = group_sums(y) / counts
+        else:
+            x_mean = np.zeros((n_groups, q))
+            y_mean = np.zeros(n_groups)
+        x = x - x_mean[codes]
+        y = y - y_mean[codes]
+        scale = np.sqrt(group_sums(x**2))
+        x = x / np.where(scale > 0, scale, 1)[codes]
+    
+    # Normal equations of all groups, solved together
+    gram = group_sums(x[:, :, None] * x[:, None, :])
+    xty = group_sums(x * y[:, None])
+    full_rank = ((counts > p) & np.all(scale > 0, axis=1) &
+                 (np.linalg.matrix_rank(gram, hermitian=True) == q))
+    gram[~full_rank] = np.eye(q)
+    beta = np.linalg.solve(gram, xty[..., None])[..., 0]
+    
+    # Residuals and total sum of squares
+    resid = y - np.sum(x * beta[codes], axis=1)
+    ssr = group_sums(resid**2)
+    tss = group_sums(y**2)
+    df_resid = counts - p
+    
+    # Back to the original scale; for the intercept: var(mean(y)) = s2/n
+    with np.errstate(invalid='ignore', divide='ignore'):
+        s2 = ssr / df_resid
+        cov = s2[:, None, None] * np.linalg.inv(gram) / (scale[:, :, None] *
+                                                         scale[:, None, :])
+        params = beta / scale
+        bse = np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+        if has_const:
+            intercept = y_mean - np.sum(x_mean * params, axis=1)
+            var_intercept = s2/counts + np.einsum('gi,gij,gj->g', x_mean,
+                                                  cov, x_mean)
+            params = np.column_stack((intercept, params))
+            bse = np.column_stack((np.sqrt(var_intercept), bse))
+        df_model = p - has_const
+        F = (tss - ssr)/df_model / s2
+    
+    params[~full_rank] = bse[~full_rank] = F[~full_rank] = np.nan
+    tval = params / bse
+    
+    index = pd.MultiIndex.from_product([labels, ['Intercept']*has_const +
+                                        predictors], names=[group, 'term'])
+    coefs = pd.DataFrame({'coef': params.ravel(), 'std err': bse.ravel(),
+                          't': tval.ravel(),
+                          'P>|t|': 2*stats.t.sf(np.abs(tval),
+                                                df_resid[:, None]).ravel()},
+                         index=index)
+    fits = pd.DataFrame({'nobs': counts, 'df_resid': df_resid,
+                         'rsquared': np.where(full_rank, 1 - ssr/tss, np.nan),
+                         'F': F,
+                         'Pr(>F)': stats.f.sf(F, df_model, df_resid)},
+                        index=pd.Index(labels, name=group))
+    
+    return (coefs, fits)
+    
+    
 if __name__ == '__main__':
     model_formulas()
     polynomial_regression()
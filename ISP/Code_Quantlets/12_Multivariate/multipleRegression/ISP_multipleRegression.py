@@ -4,6 +4,7 @@
 - Demonstrates how to make a 3d plot.
 - Example of multiscatterplot, for visualizing correlations in three- to
   six-dimensional datasets.
+- Out-of-core fit, for point clouds that do not fit into memory.
 """
 
 # author: Thomas Haslwanter, date: Nov-2015
@@ -17,7 +18,7 @@ import seaborn as sns
 # additional packages
 import sys
 import os
-from typing import Tuple, List
+from typing import Tuple, List, Iterable, Iterator
 
 sys.path.append(os.path.join('..', '..', 'Utilities'))
 
@@ -38,6 +39,7 @@ from matplotlib import cm
 
 # ... and for the statistic
 from statsmodels.formula.api import ols
+from scipy import linalg, stats
 
 
 def generateData() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
@@ -136,6 +138,108 @@ def linearModel(X:np.ndarray, Y:np.ndarray, Z:np.ndarray):
     return bestfit
                   
 
+def pointChunks(X: np.ndarray, Y: np.ndarray, Z: np.ndarray,
+                chunk_size: int=10**6) -> Iterator[Tuple[np.ndarray,
+                                                         np.ndarray]]:
+    """Split the data into chunks for "chunkedRegression". The data can also
+    be memory-mapped arrays (np.memmap, or np.load(..., mmap_mode='r')), so
+    only one chunk at a time is read into memory.
+    
+    Parameters
+    ----------
+    X : x-values (vector)
+    Y : y-values (vector)
+    Z : z-values (vector)
+    chunk_size : number of points per chunk
+    
+    Returns
+    -------
+    chunks : iterator over (predictors, response)
+    """
+    
+    for start in range(0, len(Z), chunk_size):
+        stop = start + chunk_size
+        yield (np.column_stack((X[start:stop], Y[start:stop])),
+               np.asarray(Z[start:stop], dtype=float))
+    
+    
+def chunkedRegression(chunks: Iterable[Tuple[np.ndarray, np.ndarray]],
+                      names: Tuple[str, ...]=('x', 'y'), alpha: float=0.05
+                      ) -> Tuple[np.ndarray, np.ndarray, pd.DataFrame, dict]:
+    """Out-of-core multilinear regression (with intercept), with the same
+    results as "ols"
+    
+    Only the triangular factor R of [1, predictors, response] is kept; it
+    is updated with each chunk by a QR-decomposition of the stacked
+    [R; chunk] ("TSQR"), which is numerically more stable than accumulating
+    X'X. Memory therefore only depends on the chunk size.
+    
+    Parameters
+    ----------
+    chunks : iterable over (predictors, response), with the predictors in
+             columns; e.g. from "pointChunks"
+    names : names of the predictors
+    alpha : significance level for the confidence intervals
+    
+    Returns
+    -------
+    params : coefficients of the fit, starting with the intercept
+    bse : standard errors of the coefficients
+    table : summary table, with the same columns as
+            "ols(...).fit().summary2().tables[1]"
+    info : dictionary, with the entries
+           - n : number of points
+           - df_resid : residual degrees of freedom
+           - ssr : residual sum of squares
+           - rsquared : coefficient of determination
+           - fvalue, f_pvalue : F-test of the overall regression
+    """
+    
+    R = None
+    n = 0
+    for (predictors, response) in chunks:
+        predictors = np.asarray(predictors, dtype=float).reshape(
+                                                    len(response), -1)
+        block = np.column_stack((np.ones(len(response)), predictors,
+                                 response))
+        if R is not None:
+            block = np.vstack((R, block))
+        R = np.linalg.qr(block, mode='r')
+        n += len(response)
+        
+    p = R.shape[1] - 1
+    qty = R[:, p]
+    params = linalg.solve_triangular(R[:p, :p], qty[:p])
+    
+    # Residuals: with the intercept in the first column, the residual sum of
+    # squares of the intercept-only model is the total sum of squares
+    df_resid = n - p
+    ssr = qty[p]**2
+    tss = np.sum(qty[1:]**2)
+    scale = ssr / df_resid
+    
+    R_inv = linalg.solve_triangular(R[:p, :p], np.eye(p))
+    bse = np.sqrt(scale * np.sum(R_inv**2, axis=1))
+    
+    tval = params / bse
+    tcrit = stats.t.ppf(1-alpha/2, df_resid)
+    table = pd.DataFrame({'Coef.': params, 'Std.Err.': bse, 't': tval,
+                          'P>|t|': 2*stats.t.sf(np.abs(tval), df_resid),
+                          f'[{alpha/2}': params - tcrit*bse,
+                          f'{1-alpha/2}]': params + tcrit*bse},
+                         index=['Intercept', *names])
+    
+    fvalue = (tss-ssr)/(p-1) / scale
+    info = {'n': n,
+            'df_resid': df_resid,
+            'ssr': ssr,
+            'rsquared': 1 - ssr/tss,
+            'fvalue': fvalue,
+            'f_pvalue': stats.f.sf(fvalue, p-1, df_resid)}
+    
+    return (params, bse, table, info)
+    
+    
 def scatterplot() -> None:
     """Fancy scatterplots, using the package "seaborn" """
     
@@ -149,3 +253,4 @@ if __name__ == '__main__':
     (X,Y,Z) = generateData()    
     regressionModel(X,Y,Z)    
     linearModel(X,Y,Z)
+    print(chunkedRegression(pointChunks(X,Y,Z, chunk_size=1000))[2])
@@ -18,6 +18,9 @@ import seaborn as sns
 
 # additional packages
 import sys
+import time
+from typing import Iterable, Sequence
+from scipy import special
 sys.path.append(os.path.join('..', '..', 'Utilities'))
 
 try:
@@ -54,40 +57,242 @@ def getData() -> np.ndarray:
     return data
     
 
-def prepareForFit(inData: np.ndarray) -> pd.DataFrame:
+def prepareForFit(inData: np.ndarray, names: Sequence[str]=('temp',)
+                  ) -> pd.DataFrame:
     """ Make the temperature-values unique, and count the number of failures
     and successes.
     
     Parameters
     ----------
-    data : the info from the space shuttle launches
+    inData : the info from the space shuttle launches. The first columns
+             contain the covariates, the last column the outcome
+             (1 for failure).
+    names : names of the covariates. With more than one covariate, each
+            unique combination of values forms one row.
     
     Returns
     -------
-    df : 
+    df : covariates, and the number of 'failed', 'ok', and 'total' starts.
+         The index contains the covariate values.
     """
     
+    covariates = inData[:, :len(names)]
+    failed = inData[:, -1] == 1
+    
+    # Combine the covariates into one integer code per row ...
+    (levels, inverses) = zip(*[np.unique(column, return_inverse=True)
+                               for column in covariates.T])
+    dims = [len(level) for level in levels]
+    (codes, index) = np.unique(np.ravel_multi_index(inverses, dims),
+                               return_inverse=True)
+    values = np.column_stack([level[ii] for (level, ii) in
+                              zip(levels, np.unravel_index(codes, dims))])
+    
+    # ... and count the number of starts and failures for each code
+    total = np.bincount(index, minlength=len(values))
+    num_failed = np.bincount(index[failed], minlength=len(values))
+    
     # Create a dataframe, with suitable columns for the fit
-    df = pd.DataFrame()
-    df['temp'] = np.unique(inData[:,0])
-    df['failed'] = 0
-    df['ok'] = 0
-    df['total'] = 0
-    df.index = df.temp.values
-    
-    # Count the number of starts and failures
-    for ii in range(inData.shape[0]):
-        curTemp = inData[ii,0]
-        curVal  = inData[ii,1]
-        df.loc[curTemp,'total'] += 1
-        if curVal == 1:
-            df.loc[curTemp, 'failed'] += 1
-        else:
-            df.loc[curTemp, 'ok'] += 1
+    df = pd.DataFrame(values, columns=list(names))
+    df['failed'] = num_failed
+    df['ok'] = total - num_failed
+    df['total'] = total
+    if len(names) == 1:
+        df.index = df[names[0]].values
+    else:
+        df.index = pd.MultiIndex.from_arrays(values.T, names=names)
+    
+    return df
+
+
+def prepareForFit_stream(chunks: Iterable[np.ndarray],
+                         names: Sequence[str]=('temp',)) -> pd.DataFrame:
+    """ Same as "prepareForFit", for data that arrive in chunks. The counts
+    are merged after each chunk, so only the aggregated frame is kept in
+    memory.
+    
+    Parameters
+    ----------
+    chunks : blocks of rows, with the same layout as for "prepareForFit"
+    names : names of the covariates
+    
+    Returns
+    -------
+    df : covariates, and the number of 'failed', 'ok', and 'total' starts
+    """
+    
+    counts = ['failed', 'ok', 'total']
+    df = prepareForFit(np.empty((0, len(names)+1)), names)[counts]
+    for chunk in chunks:
+        df = pd.concat((df, prepareForFit(chunk, names)[counts])).groupby(
+                level=list(range(len(names)))).sum()
+    
+    # the covariates as columns, in front of the counts
+    for (ii, name) in enumerate(names):
+        df.insert(ii, name, df.index.get_level_values(ii))
     
     return df
 
 
+def fitBinomial(X: np.ndarray, successes: np.ndarray, trials: np.ndarray,
+                start_params: np.ndarray=None, tol: float=1e-8,
+                max_iter: int=100) -> tuple:
+    """ Logistic regression for aggregated binomial data, with iteratively
+    reweighted least squares (IRLS). Gives the same results as
+    "glm('successes + failures ~ ...', family=Binomial())", but without the
+    formula parsing and model setup.
+    
+    Parameters
+    ----------
+    X : design matrix (including a column of ones for the intercept)
+    successes : number of successes for each row of X
+    trials : number of trials for each row of X
+    start_params : warm start, e.g. the parameters of a previous fit. If
+                   None, the iteration starts from the observed proportions.
+    tol : convergence criterion, for the change in the deviance
+    max_iter : maximum number of iterations
+    
+    Returns
+    -------
+    params : fitted parameters
+    bse : standard errors of the parameters
+    info : dictionary, containing
+        - n_iter : number of iterations
+        - converged : True if the deviance converged
+        - deviance : deviance of the fit
+    """
+    
+    X = np.asarray(X, dtype=float)
+    successes = np.asarray(successes, dtype=float)
+    trials = np.asarray(trials, dtype=float)
+    proportion = successes/trials
+    
+    def deviance(mu: np.ndarray) -> float:
+        return 2*np.sum(special.xlogy(successes, proportion/mu) +
+                        special.xlogy(trials-successes,
+                                      (1-proportion)/(1-mu)))
+    
+    if start_params is None:
+        mu = (successes + 0.5)/(trials + 1)
+        eta = special.logit(mu)
+    else:
+        eta = X @ start_params
+        mu = special.expit(eta)
+    
+    (dev_old, converged) = (np.inf, False)
+    for n_iter in range(1, max_iter+1):
+        # weighted least squares, with the working response z
+        variance = np.clip(mu*(1-mu), 1e-10, None)
+        weights = trials*variance
+        z = eta + (proportion - mu)/variance
+        XtW = X.T * weights
+        params = np.linalg.solve(XtW @ X, XtW @ z)
+        
+        eta = X @ params
+        mu = np.clip(special.expit(eta), 1e-10, 1-1e-10)
+        dev = deviance(mu)
+        if np.abs(dev - dev_old) <= tol*(np.abs(dev) + 0.1):
+            converged = True
+            break
+        dev_old = dev
+    
+    # covariance from the information matrix at the final estimate
+    weights = trials*mu*(1-mu)
+    bse = np.sqrt(np.diag(np.linalg.inv((X.T * weights) @ X)))
+    
+    return (params, bse, {'n_iter': n_iter, 'converged': converged,
+                          'deviance': dev})
+
+
+def fitBinomial_rolling(X: np.ndarray, successes: np.ndarray,
+                        trials: np.ndarray, window: int,
+                        step: int=1) -> tuple:
+    """ Fit the same binomial model to rolling windows of the data. Each fit
+    is warm-started with the parameters of the previous window.
+    
+    Parameters
+    ----------
+    X : design matrix (including a column of ones for the intercept)
+    successes : number of successes for each row of X
+    trials : number of trials for each row of X
+    window : number of rows per window
+    step : shift between successive windows
+    
+    Returns
+    -------
+    params : fitted parameters, shape (n_windows, n_params)
+    bse : standard errors, shape (n_windows, n_params)
+    n_iter : number of IRLS iterations for each window
+    """
+    
+    (X, successes, trials) = (np.asarray(X), np.asarray(successes),
+                              np.asarray(trials))
+    starts = np.arange(0, len(X)-window+1, step)
+    params = np.empty((len(starts), X.shape[1]))
+    bse = np.empty_like(params)
+    n_iter = np.empty(len(starts), dtype=int)
+    
+    previous = None
+    for (ii, start) in enumerate(starts):
+        selection = slice(start, start+window)
+        (params[ii], bse[ii], info) = fitBinomial(X[selection],
+                successes[selection], trials[selection], previous)
+        n_iter[ii] = info['n_iter']
+        previous = params[ii] if info['converged'] else None
+    
+    return (params, bse, n_iter)
+
+
+def benchmark_glm(n_points: int=1000, window: int=100) -> pd.DataFrame:
+    """ Compare the rolling IRLS fits with the statsmodels formula interface,
+    on simulated data with the same structure as the Challenger data.
+    
+    Parameters
+    ----------
+    n_points : number of (temperature, counts) rows
+    window : number of rows per window
+    
+    Returns
+    -------
+    results : duration [sec] and largest parameter difference to statsmodels
+    """
+    
+    rng = np.random.default_rng(1234)
+    temp = rng.uniform(50, 85, n_points)
+    total = rng.integers(5, 50, n_points)
+    ok = rng.binomial(total, special.expit(-15 + 0.23*temp))
+    df = pd.DataFrame({'temp': temp, 'ok': ok, 'failed': total-ok})
+    X = np.column_stack((np.ones(n_points), temp))
+    
+    t_start = time.perf_counter()
+    params_sm = np.array([
+            glm('ok + failed ~ temp', data=df.iloc[start:start+window],
+                family=Binomial()).fit().params.values
+            for start in range(n_points-window+1)])
+    t_sm = time.perf_counter() - t_start
+    
+    t_start = time.perf_counter()
+    params_cold = np.array([
+            fitBinomial(X[start:start+window], ok[start:start+window],
+                        total[start:start+window])[0]
+            for start in range(n_points-window+1)])
+    t_cold = time.perf_counter() - t_start
+    
+    t_start = time.perf_counter()
+    (params_warm, bse, n_iter) = fitBinomial_rolling(X, ok, total, window)
+    t_warm = time.perf_counter() - t_start
+    
+    results = pd.DataFrame({
+            'time': [t_sm, t_cold, t_warm],
+            'max_diff': [0, np.max(np.abs(params_cold - params_sm)),
+                         np.max(np.abs(params_warm - params_sm))]},
+            index=['statsmodels', 'IRLS', 'IRLS, warm start'])
+    print(f'\n{n_points-window+1} rolling fits, window = {window}:')
+    print(results)
+    
+    return results
+
+
 def logistic(x: np.ndarray, beta:float, alpha:float=0) -> np.ndarray:
     """ Logistic Function """
     
@@ -145,5 +350,10 @@ if __name__ == '__main__':
     
     print(model.summary())
     
+    # the same fit, directly from the design matrix
+    X = np.column_stack((np.ones(len(dfFit)), dfFit.temp))
+    (params, bse, info) = fitBinomial(X, dfFit.ok, dfFit.total)
+    print(f'IRLS: params = {params}, standard errors = {bse}')
+    
     showResults(inData, model)
     
@@ -8,10 +8,13 @@ Based on original code in https://github.com/fabianp/minirank
 # Import standard packages
 import numpy as np
 import matplotlib.pyplot as plt
-from typing import Tuple
+from typing import Tuple, List
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Import additional required packages
-from sklearn import linear_model, metrics, preprocessing, datasets
+from sklearn import linear_model, metrics, preprocessing, datasets, base
 from sklearn.model_selection import ShuffleSplit
 import mord
 
@@ -51,17 +54,12 @@ def get_data() -> Tuple[np.ndarray, np.ndarray]:
     return (X, y)
 
 
-def compare_models(X: np.ndarray, y: np.ndarray) -> Tuple:
-    """Fit and evaluate the different models
-    
-    Parameters
-    ----------
-    X : features
-    y : targets
+def create_models() -> List[Classifier]:
+    """Create the 3 models that are compared
     
     Returns
     -------
-    models : fitted models and fitting scores
+    models : untrained classifiers
     """
     
     # Initialize the models
@@ -73,6 +71,24 @@ def compare_models(X: np.ndarray, y: np.ndarray) -> Tuple:
     models.append( Classifier('oridinal_logistic', mord.LogisticAT(alpha=1.)) )
     models.append( Classifier('ridge', linear_model.Ridge(alpha=1.)) )
     
+    return models
+
+
+def compare_models(X: np.ndarray, y: np.ndarray) -> Tuple:
+    """Fit and evaluate the different models
+    
+    Parameters
+    ----------
+    X : features
+    y : targets
+    
+    Returns
+    -------
+    models : fitted models and fitting scores
+    """
+    
+    models = create_models()
+    
     # Perform repeated training, to provide a realistic comparison
     n_splits = 50
     rs = ShuffleSplit(n_splits=n_splits, test_size=0.1, random_state=0)
@@ -94,6 +110,112 @@ def compare_models(X: np.ndarray, y: np.ndarray) -> Tuple:
     return models
 
 
+# Data for the worker processes, set once per process by "_init_worker"
+_worker_args = {}
+
+def _init_worker(data_dir: str, models: List[Classifier]) -> None:
+    """Memory-map the features and targets, and store the models"""
+    
+    _worker_args.update(
+        X=np.load(os.path.join(data_dir, 'X.npy'), mmap_mode='r'),
+        y=np.load(os.path.join(data_dir, 'y.npy'), mmap_mode='r'),
+        models=models)
+
+
+def _fit_fold(task: tuple) -> tuple:
+    """Train one model on one fold, and evaluate it on the test data
+
+    Parameters
+    ----------
+    task : (fold, model_index, train, test)
+
+    Returns
+    -------
+    fold : number of the fold
+    model_index : index of the model
+    score : mean absolute error on the test data
+    """
+    
+    (fold, model_index, train, test) = task
+    (X, y) = (_worker_args['X'], _worker_args['y'])
+    
+    clf = base.clone(_worker_args['models'][model_index].clf)
+    clf.fit(X[train], y[train])
+    score = metrics.mean_absolute_error(clf.predict(X[test]), y[test])
+    
+    return (fold, model_index, score)
+
+
+def compare_models_parallel(X: np.ndarray, y: np.ndarray,
+                            models: List[Classifier]=None,
+                            n_splits: int=50,
+                            n_jobs: int=None) -> Tuple:
+    """Same as "compare_models", but every (fold, model) pair is trained in
+    a separate task of a process pool. The features and targets are saved
+    once to a temporary file, which the workers memory-map, so they are not
+    pickled for every task.
+    
+    Parameters
+    ----------
+    X : features
+    y : targets
+    models : untrained classifiers [default: "create_models()"]
+    n_splits : number of folds
+    n_jobs : number of worker processes [default: number of cores]; with
+             n_jobs=1, everything runs in the current process
+    
+    Returns
+    -------
+    models : models, with the fitting scores
+    scores : structured array, with the fields 'fold', 'model' (index into
+             "models"), and 'mae'
+    """
+    
+    if models is None:
+        models = create_models()
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+    
+    # we need the train set to contain all different classes
+    rs = ShuffleSplit(n_splits=n_splits, test_size=0.1, random_state=0)
+    tasks = [(fold, model_index, train, test)
+             for (fold, (train, test)) in enumerate(rs.split(X))
+             if set(y[train]) == set(y)
+             for model_index in range(len(models))]
+    
+    scores = np.zeros(len(tasks), dtype=[('fold', int), ('model', int),
+                                         ('mae', float)])
+    with tempfile.TemporaryDirectory() as data_dir:
+        np.save(os.path.join(data_dir, 'X.npy'), X)
+        np.save(os.path.join(data_dir, 'y.npy'), y)
+        
+        if n_jobs == 1:
+            _init_worker(data_dir, models)
+            results = map(_fit_fold, tasks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=n_jobs,
+                    initializer=_init_worker, initargs=(data_dir, models))
+            results = as_completed([executor.submit(_fit_fold, task)
+                                    for task in tasks])
+        try:
+            for (ii, result) in enumerate(results):
+                printProgressBar(ii+1, len(tasks), prefix = 'Progress:',
+                                 suffix = 'Complete', length = 40)
+                (fold, model_index, score) = result if executor is None \
+                                             else result.result()
+                scores[ii] = (fold, model_index, score)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    
+    scores.sort(order=['fold', 'model'])
+    for (model_index, model) in enumerate(models):
+        model.scores = list(scores['mae'][scores['model'] == model_index])
+    
+    return (models, scores)
+
+
 def show_results(models, out_file: str) -> None:
     """Generate a nice output plot
     
@@ -176,7 +298,7 @@ if __name__ == '__main__':
     out_file = 'ordinal_logistic_regression.jpg'
     
     X, y = get_data()
-    models = compare_models(X, y)
+    models, scores = compare_models_parallel(X, y)
     show_results(models, out_file)
     
     
@@ -17,9 +17,16 @@ import seaborn as sns
 import os
 
 # additional packages
-import pymc as pm
 from scipy.stats.mstats import mquantiles
+from scipy import optimize
 from typing import Tuple
+import time
+
+try:
+# The legacy PyMC2 API is only required for "mcmcSimulations"
+    import pymc as pm
+except ImportError:
+    pm = None
 
 # additional packages
 import sys
@@ -143,6 +150,175 @@ def mcmcSimulations(temperature: np.ndarray, failures: np.ndarray) -> Tuple:
     return(alpha_samples, beta_samples)
 
 
+def logPosterior(params: np.ndarray, temperature: np.ndarray,
+                 failures: np.ndarray, prior_var: float=1000.) -> np.ndarray:
+    """Log-posterior (up to a constant) of the logistic model, with normal
+    priors on alpha and beta
+    
+    Parameters
+    ----------
+    params : (alpha, beta) values, shape (..., 2)
+    temperature : temperature data
+    failures : corresponding failure status
+    prior_var : variance of the normal priors (PyMC2 precision 0.001)
+    
+    Returns
+    -------
+    log_post : log-posterior, shape (...)
+    """
+    
+    (alpha, beta) = (params[..., :1], params[..., 1:])
+    eta = beta*temperature + alpha
+    
+    # p = 1/(1+exp(eta)) is the probability of a failure
+    log_lik = np.sum((1-failures)*eta - np.logaddexp(0, eta), axis=-1)
+    
+    return log_lik - np.sum(params**2, axis=-1)/(2*prior_var)
+
+
+def rhat(chains: np.ndarray) -> np.ndarray:
+    """Split-R-hat (Gelman-Rubin) convergence diagnostic
+    
+    Parameters
+    ----------
+    chains : samples, shape (n_chains, n_samples, n_params)
+    
+    Returns
+    -------
+    rhat : one value per parameter; values close to 1 indicate convergence
+    """
+    
+    # split each chain into two halves
+    half = chains.shape[1]//2
+    chains = np.concatenate((chains[:, :half], chains[:, -half:]))
+    
+    within = np.mean(np.var(chains, axis=1, ddof=1), axis=0)
+    between = half * np.var(np.mean(chains, axis=1), axis=0, ddof=1)
+    var_plus = (half-1)/half * within + between/half
+    
+    return np.sqrt(var_plus/within)
+
+
+def effectiveSampleSize(chains: np.ndarray) -> np.ndarray:
+    """Multi-chain effective sample size, from the autocorrelations of the
+    chains (with Geyer's initial monotone sequence, as in Stan)
+    
+    Parameters
+    ----------
+    chains : samples, shape (n_chains, n_samples, n_params)
+    
+    Returns
+    -------
+    ess : one value per parameter
+    """
+    
+    (n_chains, n_samples, n_params) = chains.shape
+    centered = chains - np.mean(chains, axis=1, keepdims=True)
+    
+    # autocovariance of each chain, with the FFT
+    n_fft = 2**int(np.ceil(np.log2(2*n_samples)))
+    spectrum = np.fft.rfft(centered, n=n_fft, axis=1)
+    acov = np.fft.irfft(np.abs(spectrum)**2, n=n_fft,
+                        axis=1)[:, :n_samples] / n_samples
+    
+    within = np.mean(acov[:, 0] * n_samples/(n_samples-1), axis=0)
+    var_plus = within*(n_samples-1)/n_samples
+    if n_chains > 1:
+        var_plus += np.var(np.mean(chains, axis=1), axis=0, ddof=1)
+    rho = 1 - (within - np.mean(acov, axis=0)) / var_plus
+    
+    ess = np.empty(n_params)
+    for ii in range(n_params):
+        # sums of adjacent pairs, truncated at the first negative pair, and
+        # made monotone
+        pairs = rho[:-1:2, ii] + rho[1::2, ii]
+        num_positive = np.argmax(pairs < 0) if np.any(pairs < 0) \
+                       else len(pairs)
+        pairs = np.minimum.accumulate(pairs[:num_positive])
+        tau = -1 + 2*np.sum(pairs)
+        ess[ii] = n_chains*n_samples / max(tau, 1/np.log10(n_chains*n_samples))
+    
+    return ess
+
+
+def metropolisSampler(temperature: np.ndarray, failures: np.ndarray,
+                      n_chains: int=16, n_samples: int=2500,
+                      n_tune: int=1000, rng=1234) -> Tuple:
+    """Random-walk Metropolis sampler, which advances all chains at once
+    
+    The chains start from overdispersed points around the posterior mode.
+    During the tuning phase, the proposal covariance is estimated from the
+    current positions of all chains, and its scale is adapted towards an
+    acceptance rate of 0.234. Afterwards the proposal is kept fixed.
+    
+    Parameters
+    ----------
+    temperature : temperature data
+    failures : corresponding failure status
+    n_chains : number of chains
+    n_samples : number of samples per chain, after tuning
+    n_tune : number of tuning steps per chain, which are discarded
+    rng : seed, or numpy random Generator
+    
+    Returns
+    -------
+    alpha_samples : posterior distribution of alpha values
+    beta_samples :  posterior distribution of beta values
+    info : dictionary, containing
+        - chains : samples, shape (n_chains, n_samples, 2)
+        - acceptance : acceptance rate after tuning
+        - rhat : split-R-hat for (alpha, beta)
+        - ess : effective sample size for (alpha, beta)
+        - ess_per_sec : effective samples per second
+    """
+    
+    rng = np.random.default_rng(rng)
+    t_start = time.perf_counter()
+    log_post = lambda params: logPosterior(params, temperature, failures)
+    
+    # Start around the posterior mode, with twice its standard deviation
+    result = optimize.minimize(lambda params: -log_post(params), np.zeros(2),
+                               method='BFGS')
+    cov = result.hess_inv
+    chol = np.linalg.cholesky(cov)
+    position = result.x + 2*rng.standard_normal((n_chains, 2)) @ chol.T
+    current = log_post(position)
+    
+    # Optimal scaling for random-walk Metropolis, in 2 dimensions
+    log_scale = np.log(2.38/np.sqrt(2))
+    chains = np.empty((n_chains, n_samples, 2))
+    num_accepted = 0
+    
+    for step in range(n_tune + n_samples):
+        proposal = position + np.exp(log_scale) * \
+                   rng.standard_normal((n_chains, 2)) @ chol.T
+        candidate = log_post(proposal)
+        accept = np.log(rng.random(n_chains)) < candidate - current
+        position[accept] = proposal[accept]
+        current[accept] = candidate[accept]
+        
+        if step < n_tune:
+            # Robbins-Monro adaptation of the scale, and of the covariance
+            log_scale += (np.mean(accept) - 0.234) / np.sqrt(step+1)
+            if (step+1) % 100 == 0:
+                cov = 0.5*cov + 0.5*np.cov(position.T)
+                chol = np.linalg.cholesky(cov + 1e-10*np.eye(2))
+        else:
+            chains[:, step-n_tune] = position
+            num_accepted += np.sum(accept)
+    
+    duration = time.perf_counter() - t_start
+    ess = effectiveSampleSize(chains)
+    info = {'chains': chains,
+            'acceptance': num_accepted/(n_chains*n_samples),
+            'rhat': rhat(chains),
+            'ess': ess,
+            'ess_per_sec': ess/duration}
+    
+    samples = chains.reshape(-1, 2)
+    return (samples[:, :1], samples[:, 1:], info)
+
+
 def showSimResults(alpha_samples, beta_samples) -> None:
     """Show the results of the simulations, and save them to an outFile
     
@@ -172,26 +348,131 @@ def showSimResults(alpha_samples, beta_samples) -> None:
     showData(outFile)
     
     
-def calculateProbability(alpha_samples, beta_samples, temperature, failures):
-    """Calculate the mean probability, and the CIs
+def _orderStatistics(blocks, n: int, ranks: np.ndarray,
+                     pilot: np.ndarray) -> np.ndarray:
+    """Exact order statistics along the first axis of an (n x m) matrix, which
+    is only available in blocks of rows.
+    
+    A pilot subsample brackets each requested rank by a range of values.
+    One pass over the blocks counts the values below each range, and
+    collects the few values inside; the order statistic is then selected
+    among these. If a bracket misses its rank, it is widened and the pass
+    repeated.
     
     Parameters
     ----------
+    blocks : function that returns an iterator over the blocks of rows
+    n : total number of rows
+    ranks : requested (0-based) ranks
+    pilot : random subsample of rows, shape (n_pilot, m)
     
     Returns
     -------
+    values : order statistics, shape (len(ranks), m)
+    """
+    
+    pilot = np.sort(pilot, axis=0)
+    n_pilot = len(pilot)
+    fraction = ranks/max(n-1, 1)
+    
+    values = np.full((len(ranks), pilot.shape[1]), np.nan)
+    for z in [4, 16, None]:
+        # bracket each rank with a binomial CI for its position in the pilot,
+        # and finally with the full range
+        if z is None:
+            low = np.full(len(ranks), -1)
+            high = np.full(len(ranks), n_pilot)
+        else:
+            margin = z*np.sqrt(n_pilot*fraction*(1-fraction)) + 2
+            low = np.floor(fraction*(n_pilot-1) - margin).astype(int)
+            high = np.ceil(fraction*(n_pilot-1) + margin).astype(int)
+        lower = np.where((low >= 0)[:, np.newaxis],
+                         pilot[np.clip(low, 0, n_pilot-1)], -np.inf)
+        upper = np.where((high < n_pilot)[:, np.newaxis],
+                         pilot[np.clip(high, 0, n_pilot-1)], np.inf)
+        
+        below = np.zeros(lower.shape, dtype=int)
+        candidates = [[] for rank in ranks]
+        for block in blocks():
+            for (ii, rank) in enumerate(ranks):
+                below[ii] += np.sum(block < lower[ii], axis=0)
+                inside = (block >= lower[ii]) & (block <= upper[ii])
+                candidates[ii].append((np.nonzero(inside)[1], block[inside]))
+        
+        done = True
+        for (ii, rank) in enumerate(ranks):
+            (columns, data) = [np.concatenate(entry)
+                               for entry in zip(*candidates[ii])]
+            order = np.lexsort((data, columns))
+            counts = np.bincount(columns, minlength=len(below[ii]))
+            position = rank - below[ii]
+            found = (position >= 0) & (position < counts)
+            start = np.cumsum(counts) - counts
+            values[ii, found] = data[order][(start + position)[found]]
+            done &= np.all(found)
+        if done:
+            break
+    
+    return values
+
+
+def calculateProbability(alpha_samples, beta_samples, temperature, failures,
+                         chunk_size: int=None):
+    """Calculate the mean probability, and the CIs
+    
+    Parameters
+    ----------
+    alpha_samples : posterior distribution of alpha values
+    beta_samples : posterior distribution of beta values
+    temperature : temperature data
+    failures : corresponding failure status
+    chunk_size : if given, the posterior draws are processed in blocks of
+                 this size, and the full (draws x temperatures) matrix is
+                 never created. The quantiles are the same as with
+                 "mquantiles".
     
+    Returns
+    -------
+    t : temperatures, shape (50, 1)
+    mean_prob_t : mean posterior probability of a failure
+    p_t : probabilities for the posterior draws. With "chunk_size", only
+          for the draws [0, 1, -2, -1].
+    quantiles : 2.5% and 97.5% quantiles of the probability
     """
     
     # Calculate the probability as a function of time
     t = np.linspace(temperature.min() - 5, temperature.max() + 5, 50)[:, None]
-    p_t = logistic(t.T, beta_samples, alpha_samples)
-    
-    mean_prob_t = p_t.mean(axis=0)
     
-    # --- Calculate CIs ---
-    # vectorized bottom and top 2.5% quantiles for "confidence interval"
-    quantiles = mquantiles(p_t, [0.025, 0.975], axis=0)
+    if chunk_size is None:
+        p_t = logistic(t.T, beta_samples, alpha_samples)
+        
+        mean_prob_t = p_t.mean(axis=0)
+        
+        # --- Calculate CIs ---
+        # vectorized bottom and top 2.5% quantiles for "confidence interval"
+        quantiles = mquantiles(p_t, [0.025, 0.975], axis=0)
+        
+        return (t, mean_prob_t, p_t, quantiles)
+    
+    n = len(alpha_samples)
+    blocks = lambda: (logistic(t.T, beta_samples[start:start+chunk_size],
+                               alpha_samples[start:start+chunk_size])
+                      for start in range(0, n, chunk_size))
+    mean_prob_t = sum(np.sum(block, axis=0) for block in blocks()) / n
+    
+    # Plotting positions of "mquantiles" (alphap=betap=0.4)
+    prob = np.array([0.025, 0.975])
+    aleph = n*prob + 0.4 + 0.2*prob
+    k = np.floor(np.clip(aleph, 1, n-1)).astype(int)
+    gamma = np.clip(aleph - k, 0, 1)[:, np.newaxis]
+    
+    stride = max(1, n // 2**14)
+    pilot = logistic(t.T, beta_samples[::stride], alpha_samples[::stride])
+    values = _orderStatistics(blocks, n, np.r_[k-1, k], pilot)
+    quantiles = (1-gamma)*values[:len(k)] + gamma*values[len(k):]
+    
+    p_t = logistic(t.T, beta_samples[[0, 1, -2, -1]],
+                   alpha_samples[[0, 1, -2, -1]])
     
     return (t, mean_prob_t, p_t, quantiles)
     
@@ -257,7 +538,9 @@ if __name__=='__main__':
     (temperature, failures) = getData()    
     showAndSave(temperature, failures)
     
-    (alpha, beta) = mcmcSimulations(temperature, failures)
+    (alpha, beta, info) = metropolisSampler(temperature, failures)
+    print('R-hat (alpha, beta): {0}'.format(info['rhat']))
+    print('ESS per second (alpha, beta): {0}'.format(info['ess_per_sec']))
     showSimResults(alpha, beta)
     
     (linearTemperature, mean_p, p, quantiles) = calculateProbability(alpha, beta, temperature, failures)
@@ -7,6 +7,7 @@ Graphical and quantitative check, if a given distribution is normal.
     distribution are not known.
 - the Kolmogorov-Smirnov(Kolmogorov-Smirnov) test should only be used for
     large sample numbers (>300)
+- "screen_normality" applies these tests to every column of a table
 """
 
 # author: Thomas Haslwanter, date: Feb-2021
@@ -15,11 +16,13 @@ Graphical and quantitative check, if a given distribution is normal.
 import numpy as np
 import matplotlib.pyplot as plt
 import scipy.stats as stats
+from scipy import special
 import pandas as pd
 
 # additional packages
 from statsmodels.stats.diagnostic import lilliefors
-from typing import List
+from typing import List, Sequence
+from concurrent.futures import ThreadPoolExecutor
 
 
 def generate_data(show_flag:bool=True) -> np.ndarray:
@@ -105,6 +108,138 @@ def check_normality(data: np.ndarray, show_flag: bool=True) -> List[float]:
     # --- >>> STOP stats <<< ---
     
     return pVals
+
+
+def _omnibus(values: np.ndarray) -> np.ndarray:
+    """D'Agostino-Pearson test (as "stats.normaltest"), for all columns at
+    once. The moments are calculated with NaNs ignored, so that the columns
+    can have different numbers of valid samples.
+
+    Parameters
+    ----------
+    values : data, shape (n_samples, n_columns)
+
+    Returns
+    -------
+    ps : p-values, one per column
+    """
+    
+    n = np.sum(~np.isnan(values), axis=0).astype(float)
+    deviations = values - np.nanmean(values, axis=0)
+    m2 = np.nanmean(deviations**2, axis=0)
+    m3 = np.nanmean(deviations**3, axis=0)
+    m4 = np.nanmean(deviations**4, axis=0)
+    
+    # Skewness test
+    y = m3/m2**1.5 * np.sqrt(((n+1)*(n+3)) / (6.0*(n-2)))
+    beta2 = (3.0*(n**2+27*n-70)*(n+1)*(n+3)) / \
+            ((n-2.0)*(n+5)*(n+7)*(n+9))
+    W2 = -1 + np.sqrt(2*(beta2-1))
+    delta = 1/np.sqrt(0.5*np.log(W2))
+    alpha = np.sqrt(2.0/(W2-1))
+    y = np.where(y == 0, 1, y)
+    z_skew = delta*np.log(y/alpha + np.sqrt((y/alpha)**2+1))
+    
+    # Kurtosis test
+    E = 3.0*(n-1)/(n+1)
+    varb2 = 24.0*n*(n-2)*(n-3) / ((n+1)*(n+1.)*(n+3)*(n+5))
+    x = (m4/m2**2 - E)/np.sqrt(varb2)
+    sqrtbeta1 = 6.0*(n*n-5*n+2)/((n+7)*(n+9)) * \
+            np.sqrt((6.0*(n+3)*(n+5)) / (n*(n-2)*(n-3)))
+    A = 6.0 + 8.0/sqrtbeta1 * (2.0/sqrtbeta1 + np.sqrt(1+4.0/sqrtbeta1**2))
+    term1 = 1 - 2/(9.0*A)
+    denom = 1 + x*np.sqrt(2/(A-4.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        term2 = np.sign(denom) * np.where(denom == 0.0, np.nan,
+                                          ((1-2.0/A)/np.abs(denom))**(1/3.0))
+    z_kurt = (term1 - term2) / np.sqrt(2/(9.0*A))
+    
+    return stats.chi2.sf(z_skew**2 + z_kurt**2, 2)
+    
+
+def _ks_normal(values: np.ndarray) -> np.ndarray:
+    """Kolmogorov-Smirnov test against a normal distribution with the mean
+    and SD of the data, for all columns at once. NaNs are ignored.
+
+    Parameters
+    ----------
+    values : data, shape (n_samples, n_columns)
+
+    Returns
+    -------
+    ps : p-values, one per column
+    """
+    
+    n = np.sum(~np.isnan(values), axis=0)
+    z = (values - np.nanmean(values, axis=0)) / np.nanstd(values, axis=0,
+                                                         ddof=1)
+    
+    # sort puts the NaNs at the end of each column
+    cdf = special.ndtr(np.sort(z, axis=0))
+    rank = np.arange(1, len(values)+1)[:, np.newaxis]
+    d_plus = np.nanmax(rank/n - cdf, axis=0)
+    d_minus = np.nanmax(cdf - (rank-1)/n, axis=0)
+    
+    return stats.kstwo.sf(np.maximum(d_plus, d_minus), n)
+    
+
+def screen_normality(data, tests: Sequence[str]=('Omnibus', 'Shapiro-Wilk',
+                     'Lilliefors', 'Kolmogorov-Smirnov'),
+                     n_jobs: int=1) -> pd.DataFrame:
+    """Apply normality tests to each column of a table
+    
+    "Omnibus" (based on skewness and kurtosis) and "Kolmogorov-Smirnov"
+    (based on the empirical distribution function) are computed for all
+    columns at once. "Shapiro-Wilk" and "Lilliefors" have to be calculated
+    column by column; this can be distributed over a pool of threads.
+    NaNs are ignored.
+
+    Parameters
+    ----------
+    data : 2D array (one variable per column), or DataFrame
+    tests : normality tests to apply
+    n_jobs : number of threads for the tests that cannot be vectorized
+
+    Returns
+    -------
+    pVals : p-values, with one row per column of "data", and one column
+            per test
+    """
+    
+    if isinstance(data, pd.DataFrame):
+        names = data.columns
+        values = data.to_numpy(dtype=float)
+    else:
+        values = np.asarray(data, dtype=float)
+        if values.ndim == 1:
+            values = values[:, np.newaxis]
+        names = np.arange(values.shape[1])
+    
+    has_nans = np.any(np.isnan(values))
+    columns = [col[~np.isnan(col)] for col in values.T] if has_nans \
+              else values.T
+    
+    # Tests that are evaluated column by column
+    single_tests = {'Shapiro-Wilk': lambda x: stats.shapiro(x)[1],
+                    'Lilliefors': lambda x: lilliefors(x)[1]}
+    
+    pVals = pd.DataFrame(index=names)
+    for test in tests:
+        if test == 'Omnibus':
+            pVals[test] = _omnibus(values)
+        elif test == 'Kolmogorov-Smirnov':
+            pVals[test] = _ks_normal(values)
+        elif test in single_tests:
+            if n_jobs == 1:
+                pVals[test] = list(map(single_tests[test], columns))
+            else:
+                with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                    pVals[test] = list(executor.map(single_tests[test],
+                                                    columns))
+        else:
+            raise ValueError(f'Unknown test: {test}')
+    
+    return pVals
     
 
 if __name__ == '__main__':
@@ -0,0 +1,281 @@
+"""Simulation-based power analysis, for tests that have no closed-form
+sample-size formula (compare "ISP_sampleSize"):
+- Mann-Whitney U test
+- Kruskal-Wallis test
+- Chi-square test for proportions
+- Logistic regression (score test of the slope)
+
+For each batch, the datasets for the largest sample size are simulated
+once, and the smaller sample sizes use the first n samples of the same
+datasets (nested subsampling). Each sample size stops as soon as the
+confidence interval of its power estimate is narrow enough.
+"""
+
+# author: Thomas Haslwanter, date: Feb-2021
+
+# Import standard packages
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+# additional packages
+from concurrent.futures import ProcessPoolExecutor
+from typing import Sequence
+
+
+def _tie_term(values: np.ndarray) -> np.ndarray:
+    """Sum of (t**3 - t) over all groups of ties, along the last axis"""
+    
+    t = stats.rankdata(values, method='max', axis=-1) - \
+        stats.rankdata(values, method='min', axis=-1) + 1
+    # every member of a tie group contributes (t**2 - 1)
+    return np.sum(t**2 - 1, axis=-1)
+
+
+def mannwhitney_p(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Two-sided Mann-Whitney U test along the last axis (normal
+    approximation with tie and continuity correction, as
+    "stats.mannwhitneyu(method='asymptotic')")
+
+    Parameters
+    ----------
+    x, y : samples of the two groups, shape (..., n1) and (..., n2)
+
+    Returns
+    -------
+    p : p-values
+    """
+    
+    (n1, n2) = (x.shape[-1], y.shape[-1])
+    N = n1 + n2
+    values = np.concatenate((x, y), axis=-1)
+    ranks = stats.rankdata(values, axis=-1)
+    
+    U = np.sum(ranks[..., :n1], axis=-1) - n1*(n1+1)/2
+    sigma = np.sqrt(n1*n2/12 * ((N+1) - _tie_term(values)/(N*(N-1))))
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (np.abs(U - n1*n2/2) - 0.5) / sigma
+    
+    return np.clip(2*stats.norm.sf(z), 0, 1)
+
+
+def kruskal_p(samples: np.ndarray) -> np.ndarray:
+    """Kruskal-Wallis test along the last two axes (as "stats.kruskal")
+
+    Parameters
+    ----------
+    samples : data, shape (..., k_groups, n) with equal group sizes
+
+    Returns
+    -------
+    p : p-values
+    """
+    
+    (k, n) = samples.shape[-2:]
+    N = k*n
+    values = samples.reshape(samples.shape[:-2] + (N,))
+    ranks = stats.rankdata(values, axis=-1).reshape(samples.shape)
+    
+    H = 12/(N*(N+1)) * np.sum(np.sum(ranks, axis=-1)**2/n, axis=-1) - 3*(N+1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        H /= 1 - _tie_term(values)/(N**3 - N)
+    
+    return stats.chi2.sf(H, k-1)
+
+
+def chi2_p(successes: np.ndarray, n: int) -> np.ndarray:
+    """Chi-square test of equal proportions (as "stats.chi2_contingency",
+    with the Yates correction for 2x2 tables)
+
+    Parameters
+    ----------
+    successes : number of successes, shape (..., k_groups)
+    n : number of subjects in each group
+
+    Returns
+    -------
+    p : p-values
+    """
+    
+    k = successes.shape[-1]
+    observed = np.stack((successes, n - successes), axis=-1)
+    expected = n * np.sum(observed, axis=-2, keepdims=True) / (k*n)
+    
+    deviation = np.abs(observed - expected)
+    if k == 2:
+        deviation = np.maximum(deviation - 0.5, 0)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chi2 = np.sum(deviation**2/expected, axis=(-2, -1))
+    
+    # without successes (or failures) there is no evidence for a difference
+    return np.where(np.isfinite(chi2), stats.chi2.sf(chi2, k-1), 1.)
+
+
+def logistic_p(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Rao's score test for the slope of a logistic regression along the
+    last axis. It is asymptotically equivalent to the Wald test, needs no
+    iterations, and is also defined for perfectly separated data.
+
+    Parameters
+    ----------
+    x : predictor, shape (..., n)
+    y : binary outcome, shape (..., n)
+
+    Returns
+    -------
+    p : p-values
+    """
+    
+    y_mean = np.mean(y, axis=-1, keepdims=True)
+    x_centered = x - np.mean(x, axis=-1, keepdims=True)
+    
+    score = np.sum(x_centered * (y - y_mean), axis=-1)
+    variance = y_mean[..., 0]*(1-y_mean[..., 0]) * np.sum(x_centered**2,
+                                                          axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chi2 = score**2/variance
+    
+    return np.where(np.isfinite(chi2), stats.chi2.sf(chi2, 1), 1.)
+
+
+def _simulate_batch(task: tuple) -> np.ndarray:
+    """Number of significant results for each sample size, for one batch of
+    simulated datasets
+
+    Parameters
+    ----------
+    task : (test, design, sizes, num, alpha, seed)
+
+    Returns
+    -------
+    num_significant : one value per sample size
+    """
+    
+    (test, design, sizes, num, alpha, seed) = task
+    rng = np.random.default_rng(seed)
+    n_max = max(sizes)
+    
+    # Simulate the datasets for the largest sample size only once
+    if test == 'mannwhitney':
+        dist = design.get('dist', stats.norm())
+        x = dist.rvs(size=(num, n_max), random_state=rng)
+        y = dist.rvs(size=(num, n_max), random_state=rng) + design['shift']
+        p_value = lambda n: mannwhitney_p(x[:, :n], y[:, :n])
+    elif test == 'kruskal':
+        dist = design.get('dist', stats.norm())
+        shifts = np.asarray(design['shifts'], dtype=float)
+        samples = dist.rvs(size=(num, len(shifts), n_max), random_state=rng)
+        samples += shifts[:, np.newaxis]
+        p_value = lambda n: kruskal_p(samples[..., :n])
+    elif test == 'chi2':
+        probs = np.asarray(design['probs'], dtype=float)
+        events = rng.random((num, len(probs), n_max)) < probs[:, np.newaxis]
+        # successes for every prefix length, in one step
+        successes = np.cumsum(events, axis=-1)
+        p_value = lambda n: chi2_p(successes[..., n-1], n)
+    elif test == 'logistic':
+        x = rng.standard_normal((num, n_max))
+        prob = 1/(1 + np.exp(-(design.get('intercept', 0) +
+                               design['slope']*x)))
+        y = (rng.random((num, n_max)) < prob).astype(float)
+        p_value = lambda n: logistic_p(x[:, :n], y[:, :n])
+    else:
+        raise ValueError(f'Unknown test: {test}')
+    
+    # ... and use the first n samples of each dataset for the other sizes
+    return np.array([np.sum(p_value(n) < alpha) for n in sizes])
+
+
+def simulate_power(test: str, sample_sizes: Sequence[int],
+                   alpha: float=0.05, max_sims: int=10000,
+                   batch_size: int=500, ci_halfwidth: float=0.01,
+                   n_jobs: int=1, rng=None, **design) -> pd.DataFrame:
+    """Monte-Carlo estimate of the test power, for a range of sample sizes
+
+    Parameters
+    ----------
+    test : 'mannwhitney' (design: shift, dist), 'kruskal' (design: shifts,
+           dist), 'chi2' (design: probs), or 'logistic' (design: slope,
+           intercept). "dist" is a frozen scipy distribution [default:
+           stats.norm()], "shift(s)" are added to the groups, "probs" are the
+           success probabilities of the groups, and for the logistic model
+           the predictor is standard normal.
+    sample_sizes : number of subjects per group (total for 'logistic')
+    alpha : significance level
+    max_sims : maximum number of simulations per sample size
+    batch_size : number of datasets that are simulated at once
+    ci_halfwidth : the simulation for a sample size stops when the 95%
+                   Wilson interval of the power is narrower than +/- this
+    n_jobs : number of worker processes; each one simulates whole batches
+    rng : seed, or SeedSequence. Every batch gets its own spawned generator
+    design : parameters of the simulated data (see "test")
+
+    Returns
+    -------
+    power : DataFrame, with the sample sizes as index, and the columns
+            'power', 'ci_low', 'ci_high', 'n_sims'
+    """
+    
+    sizes = np.unique(sample_sizes).astype(int)
+    num_significant = np.zeros(len(sizes))
+    num_sims = np.zeros(len(sizes))
+    active = np.ones(len(sizes), dtype=bool)
+    
+    seeds = rng if isinstance(rng, np.random.SeedSequence) \
+            else np.random.SeedSequence(rng)
+    z = stats.norm.ppf(0.975)
+    
+    executor = ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 \
+               else None
+    try:
+        while np.any(active):
+            # one batch per worker, for the sample sizes that are not done;
+            # the remaining simulations are split among the workers, so that
+            # "max_sims" is never exceeded
+            remaining = int(max_sims - num_sims[active].max())
+            num = min(batch_size, int(np.ceil(remaining/max(n_jobs, 1))))
+            num_tasks = min(max(n_jobs, 1), remaining // num)
+            tasks = [(test, design, sizes[active].tolist(), num, alpha, seed)
+                     for seed in seeds.spawn(num_tasks)]
+            if executor is None:
+                results = map(_simulate_batch, tasks)
+            else:
+                results = executor.map(_simulate_batch, tasks)
+            
+            num_significant[active] += np.sum(list(results), axis=0)
+            num_sims[active] += num*len(tasks)
+            
+            # Wilson score interval
+            power = num_significant/num_sims
+            halfwidth = z*np.sqrt(power*(1-power)/num_sims +
+                                  z**2/(4*num_sims**2)) / (1 + z**2/num_sims)
+            active &= (halfwidth > ci_halfwidth) & (num_sims < max_sims)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    
+    center = (power + z**2/(2*num_sims)) / (1 + z**2/num_sims)
+    
+    return pd.DataFrame({'power': power,
+                         'ci_low': center - halfwidth,
+                         'ci_high': center + halfwidth,
+                         'n_sims': num_sims.astype(int)},
+                        index=pd.Index(sizes, name='n'))
+
+
+if __name__ == '__main__':
+    sizes = [10, 20, 30, 40, 60]
+    
+    print('Mann-Whitney, shift = 0.8 SD: ---------------')
+    print(simulate_power('mannwhitney', sizes, shift=0.8, rng=1234))
+    
+    print('\nKruskal-Wallis, shifts = (0, 0.5, 1) SD: ---------------')
+    print(simulate_power('kruskal', sizes, shifts=[0, 0.5, 1], rng=1234))
+    
+    print('\nChi-square, proportions 0.3 vs 0.6: ---------------')
+    print(simulate_power('chi2', sizes, probs=[0.3, 0.6], rng=1234))
+    
+    print('\nLogistic regression, slope = 1: ---------------')
+    print(simulate_power('logistic', sizes, slope=1, rng=1234))
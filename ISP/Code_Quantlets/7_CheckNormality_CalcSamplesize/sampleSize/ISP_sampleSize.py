@@ -2,6 +2,8 @@
     for:
 - Experiments with one single group
 - Comparing two groups
+The "..._grid" functions and the inverse "power_..." functions accept arrays
+for all parameters, for the evaluation of whole study-design grids.
 """
 
 # author: Thomas Haslwanter, Feb-2021
@@ -11,6 +13,7 @@ import numpy as np
 
 # additional packages
 from scipy.stats import norm
+from typing import Tuple
 
 
 def sampleSize_oneGroup(d:float, alpha:float=0.05, beta:float=0.2,
@@ -30,7 +33,7 @@ def sampleSize_oneGroup(d:float, alpha:float=0.05, beta:float=0.2,
     n : Number of subjects required for a significant test
     """
     
-    n = np.round((norm.ppf(1-alpha/2.) + norm.ppf(1-beta))**2 * sigma**2 / d**2)
+    n = sampleSize_oneGroup_grid(d, alpha, beta, sigma)
     
     print(f'In order to detect a change of {d}' +
         f'in a group with an SD of {sigma},\n' +
@@ -57,8 +60,7 @@ def sampleSize_twoGroups(D:float, alpha:float=0.05, beta:float=0.2,
     n : Number of subjects (in each group) required for a significant test
     """
     
-    n = np.round((norm.ppf(1-alpha/2.) + \
-            norm.ppf(1-beta))**2 * (sigma1**2 + sigma2**2) / D**2)
+    n = sampleSize_twoGroups_grid(D, alpha, beta, sigma1, sigma2)
     
     print(f'In order to detect a change of {D} between groups' +
         f'with an SD of {sigma1} and {sigma2},\n' +
@@ -68,6 +70,116 @@ def sampleSize_twoGroups(D:float, alpha:float=0.05, beta:float=0.2,
     return n
 
 
+def _expand(params: Tuple, grid: bool) -> Tuple:
+    """With "grid", each 1-D parameter gets its own axis, so that the
+    results contain all parameter combinations (like np.meshgrid); scalars
+    get no axis. Otherwise the parameters are broadcast against each other.
+    """
+    
+    params = [np.asarray(param, dtype=float) for param in params]
+    if grid:
+        is_array = [param.ndim > 0 for param in params]
+        axes = iter(np.ix_(*[param for (param, flag)
+                             in zip(params, is_array) if flag]))
+        params = [next(axes) if flag else param
+                  for (param, flag) in zip(params, is_array)]
+    return params
+
+
+def sampleSize_oneGroup_grid(d, alpha=0.05, beta=0.2, sigma=1,
+                             grid: bool=False) -> np.ndarray:
+    """Sample size for a single group, for arrays of parameters (Eq 6.2).
+    Nothing is printed.
+
+    Parameters
+    ----------
+    d : Effect size(s)
+    alpha : Probability of Type I error (significance)
+    beta : Probability of Type II error
+    sigma : Standard deviation of data
+    grid : if True, the result has one axis per 1-D parameter, in the order
+           (d, alpha, beta, sigma); otherwise the parameters are broadcast
+
+    Returns
+    -------
+    n : Number of subjects required for a significant test
+    """
+    
+    (d, alpha, beta, sigma) = _expand((d, alpha, beta, sigma), grid)
+    return np.round((norm.ppf(1-alpha/2.) + norm.ppf(1-beta))**2 *
+                    sigma**2 / d**2)
+
+
+def sampleSize_twoGroups_grid(D, alpha=0.05, beta=0.2, sigma1=1, sigma2=1,
+                              grid: bool=False) -> np.ndarray:
+    """Sample size for two groups, for arrays of parameters (Eq 6.4).
+    Nothing is printed.
+
+    Parameters
+    ----------
+    D : Effect size(s)
+    alpha : Probability of Type I error (significance)
+    beta : Probability of Type II error
+    sigma1, sigma2 : Standard deviations of the two groups
+    grid : if True, the result has one axis per 1-D parameter, in the order
+           (D, alpha, beta, sigma1, sigma2); otherwise they are broadcast
+
+    Returns
+    -------
+    n : Number of subjects (in each group) required for a significant test
+    """
+    
+    (D, alpha, beta, sigma1, sigma2) = _expand((D, alpha, beta,
+                                                sigma1, sigma2), grid)
+    return np.round((norm.ppf(1-alpha/2.) + norm.ppf(1-beta))**2 *
+                    (sigma1**2 + sigma2**2) / D**2)
+
+
+def power_oneGroup(n, d, alpha=0.05, sigma=1, grid: bool=False) -> np.ndarray:
+    """Test power for a single group, i.e. Eq 6.2 solved for 1-beta.
+
+    Parameters
+    ----------
+    n : Number of subjects
+    d : Effect size
+    alpha : Probability of Type I error (significance)
+    sigma : Standard deviation of data
+    grid : if True, the result has one axis per 1-D parameter, in the order
+           (n, d, alpha, sigma); otherwise the parameters are broadcast
+
+    Returns
+    -------
+    power : Probability to detect the effect (1-beta)
+    """
+    
+    (n, d, alpha, sigma) = _expand((n, d, alpha, sigma), grid)
+    return norm.cdf(np.sqrt(n)*np.abs(d)/sigma - norm.ppf(1-alpha/2.))
+
+
+def power_twoGroups(n, D, alpha=0.05, sigma1=1, sigma2=1,
+                    grid: bool=False) -> np.ndarray:
+    """Test power for two groups, i.e. Eq 6.4 solved for 1-beta.
+
+    Parameters
+    ----------
+    n : Number of subjects in each group
+    D : Effect size
+    alpha : Probability of Type I error (significance)
+    sigma1, sigma2 : Standard deviations of the two groups
+    grid : if True, the result has one axis per 1-D parameter, in the order
+           (n, D, alpha, sigma1, sigma2); otherwise they are broadcast
+
+    Returns
+    -------
+    power : Probability to detect the effect (1-beta)
+    """
+    
+    (n, D, alpha, sigma1, sigma2) = _expand((n, D, alpha, sigma1, sigma2),
+                                            grid)
+    return norm.cdf(np.sqrt(n)*np.abs(D)/np.sqrt(sigma1**2 + sigma2**2)
+                    - norm.ppf(1-alpha/2.))
+
+
 if __name__ == '__main__':
     sampleSize_oneGroup(0.5)
     sampleSize_twoGroups(0.4, sigma1=0.6, sigma2=0.6)
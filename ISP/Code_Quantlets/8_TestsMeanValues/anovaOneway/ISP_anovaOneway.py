@@ -3,6 +3,7 @@
 - ANOVA - oneway
 - Do a simple one-way ANOVA, using statsmodels
 - Show how the ANOVA can be done by hand.
+- Vectorized ANOVA, for many groups and/or many response variables
 - For the comparison of two groups, a one-way ANOVA is equivalent to
   a T-test: t^2 = F
 """
@@ -156,7 +157,143 @@ def anova_byHand() -> Tuple[float, float]:
 
     print(f'ANOVA-Results: F = {F}, and p<{p}')
     
+    # Check if the vectorized implementation gives the same result
+    np.testing.assert_almost_equal(F, anova_vectorized(data[:,0], data[:,1])[0])
+    
+    return (F, p)
+
+
+def group_design(groups: np.ndarray) -> dict:
+    """ Everything about the grouping that does not depend on the response.
+    This has to be calculated only once for any number of response variables.
+    
+    Parameters
+    ----------
+    groups : group labels, shape (n_obs,)
+    
+    Returns
+    -------
+    design : dictionary, containing
+        - labels : the unique group labels
+        - index : group number for each observation
+        - order : sort order of the observations by group
+        - starts : first (sorted) observation of each group
+        - counts : number of observations per group
+        - df_groups, df_residuals : degrees of freedom
+    """
+    
+    (labels, group_index, counts) = np.unique(groups,
+                                        return_inverse=True, return_counts=True)
+    n_groups = len(labels)
+    n_obs = len(group_index)
+    
+    design = {'labels': labels,
+              'index': group_index,
+              'order': np.argsort(group_index, kind='stable'),
+              'starts': np.r_[0, np.cumsum(counts)[:-1]],
+              'counts': counts,
+              'df_groups': n_groups-1,
+              'df_residuals': n_obs-n_groups}
+    
+    return design
+
+
+def _anova_sorted(values: np.ndarray, design: dict
+                  ) -> Tuple[np.ndarray, np.ndarray]:
+    """ F and p for each column of "values", which are sorted by group """
+    
+    # Work with deviations from the grand mean, for numerical stability
+    centered = values - values.mean(axis=0)
+    ss_total = np.sum(centered**2, axis=0)
+    
+    # n*(mean_group - mean_total)**2 = (sum of centered values)**2 / n
+    group_sums = np.add.reduceat(centered, design['starts'], axis=0)
+    ss_treatments = np.sum(group_sums**2/design['counts'][:, np.newaxis],
+                           axis=0)
+    ss_error = ss_total - ss_treatments
+    
+    F = (ss_treatments/design['df_groups']) / \
+            (ss_error/design['df_residuals'])
+    p = stats.f(design['df_groups'], design['df_residuals']).sf(F)
+    
     return (F, p)
+
+
+def anova_vectorized(values: np.ndarray, groups: np.ndarray
+                     ) -> Tuple[np.ndarray, np.ndarray]:
+    """ One-way ANOVA without a Python loop over the groups.
+    The data are sorted by group once, and the sums for each group are
+    calculated with segment reductions; many response variables that share
+    the same grouping are handled together.
+    
+    Parameters
+    ----------
+    values : response variable(s), shape (n_obs,) or (n_obs, n_variables)
+    groups : group labels, shape (n_obs,)
+    
+    Returns
+    -------
+    F : test statistic(s)
+    p : probability(ies)
+    """
+    
+    values = np.asarray(values, dtype=float)
+    design = group_design(groups)
+    
+    if values.ndim > 1:
+        return _anova_sorted(values[design['order']], design)
+    
+    (F, p) = _anova_sorted(values[design['order'], np.newaxis], design)
+    return (F[0], p[0])
+
+
+def anova_massUnivariate(data, groups: np.ndarray, chunk_size: int=None,
+                         design: dict=None):
+    """ One-way ANOVA for many response variables that share one factor,
+    e.g. thousands of genes measured under the same treatments.
+    No model is built for the individual variables: the grouping is
+    analyzed once, and F and p are calculated for a whole block of columns
+    with array operations.
+    
+    Parameters
+    ----------
+    data : response variables, shape (n_obs, n_variables).
+           ndarray or pandas DataFrame
+    groups : group labels, shape (n_obs,)
+    chunk_size : number of columns processed at once. Only one sorted
+                 copy of a chunk is held in memory at any time.
+                 [default=None, i.e. all columns at once]
+    design : result of "group_design(groups)", if it is already available
+    
+    Returns
+    -------
+    results : F-values and p-values. For a DataFrame input a DataFrame,
+              with the columns of "data" as index; otherwise a tuple (F, p)
+    """
+    
+    if design is None:
+        design = group_design(groups)
+    
+    is_frame = isinstance(data, pd.DataFrame)
+    values = data.to_numpy(dtype=float) if is_frame else np.asarray(data)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+    
+    n_vars = values.shape[1]
+    if chunk_size is None:
+        chunk_size = n_vars
+    
+    F = np.empty(n_vars)
+    p = np.empty(n_vars)
+    for first in range(0, n_vars, chunk_size):
+        cols = slice(first, min(first+chunk_size, n_vars))
+        chunk = values[design['order'], cols].astype(float, copy=False)
+        (F[cols], p[cols]) = _anova_sorted(chunk, design)
+    
+    if is_frame:
+        return pd.DataFrame({'F': F, 'PR(>F)': p}, index=data.columns)
+    else:
+        return (F, p)
     
 
 if __name__ == '__main__':
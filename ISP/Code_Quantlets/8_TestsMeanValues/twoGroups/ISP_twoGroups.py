@@ -1,6 +1,7 @@
 """ Comparison of two groups
 - Analysis of paired data
 - Analysis of unpaired data
+- Permutation tests, for both cases
 """
 
 # author: Thomas Haslwanter, date: Feb-2021
@@ -9,6 +10,9 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import scipy.stats as stats
+from scipy.special import comb
+from itertools import combinations
+from typing import Tuple
 
 
 def paired_data() -> float:
@@ -46,6 +50,10 @@ def paired_data() -> float:
     # --- >>> STOP stats <<< ---
     print(("Wilcoxon-Signed-Rank-Sum test", p_value))
     
+    # Distribution-free: randomly flip the sign of the differences
+    p_perm, info = permutation_test(post, pre, paired=True, rng=1234)
+    print(("Sign-flip permutation test", p_perm))
+    
     return p_value # should be 0.0033300139117459797
     # z-value -2.9341
 
@@ -91,6 +99,10 @@ def unpaired_data() -> float:
     print('Mann-Whitney test: p = {p_value:5.3f}')
     # --- >>> STOP stats <<< ---
     
+    # Distribution-free: randomly re-assign the values to the two groups
+    p_perm, info = permutation_test(group1, group2, rng=1234)
+    print(f'Permutation test: p = {p_perm:5.3f}')
+    
     # Plot the data
     plt.plot(group1, 'bx', label='obese')
     plt.plot(group2, 'ro', label='lean')
@@ -111,6 +123,131 @@ def unpaired_data() -> float:
     return p_value  # should be 0.0010608066929400244
 
 
+def _all_permutations(n: int, n_x: int, paired: bool) -> np.ndarray:
+    """ Index matrix (unpaired) or sign matrix (paired) of all permutations """
+    
+    if paired:
+        # the bits of 0 ... 2**n-1 give all sign combinations
+        bits = (np.arange(2**n)[:, np.newaxis] >> np.arange(n)) & 1
+        return 1 - 2*bits
+    else:
+        # only the choice of the first group matters
+        return np.array(list(combinations(range(n), n_x)))
+    
+
+def _random_permutations(n: int, n_x: int, paired: bool, num: int,
+                         rng: np.random.Generator) -> np.ndarray:
+    """ Index matrix (unpaired) or sign matrix (paired) of random
+    permutations """
+    
+    if paired:
+        return rng.choice([-1, 1], size=(num, n))
+    else:
+        index = np.tile(np.arange(n), (num, 1))
+        return rng.permuted(index, axis=1)[:, :n_x]
+    
+
+def permutation_test(x: np.ndarray, y: np.ndarray=None, paired: bool=False,
+                     n_permutations: int=10000, alternative: str='two-sided',
+                     alpha: float=0.05, early_stop: bool=True,
+                     batch_size: int=1000, rng=None) -> Tuple[float, dict]:
+    """ Permutation test for the difference of the means
+    
+    Paired data (or a single sample, if "y" is None) are tested with random
+    sign flips of the differences; unpaired data by randomly re-assigning
+    the values to the two groups. The permutations are generated as index
+    (or sign) matrices, and the statistic is computed for a whole batch at
+    once. If the number of possible permutations is not larger than
+    "n_permutations", all of them are enumerated and the p-value is exact.
+    
+    Parameters
+    ----------
+    x : data of the first group
+    y : data of the second group (optional for paired data)
+    paired : if True, the test is performed on x-y
+    n_permutations : maximum number of random permutations
+    alternative : 'two-sided', 'greater', or 'less'
+    alpha : significance level, for the early stopping
+    early_stop : if True, the Monte-Carlo simulation stops as soon as the
+                 99% confidence interval of the p-value excludes "alpha"
+    batch_size : number of permutations that are evaluated at once
+    rng : seed, or numpy random Generator
+    
+    Returns
+    -------
+    p : p-value
+    info : dictionary, containing
+        - statistic : observed difference of the means
+        - n_permutations : number of evaluated permutations
+        - exact : True if all permutations have been evaluated
+        - ci : 99% confidence interval of the p-value (Monte-Carlo only)
+    """
+    
+    x = np.asarray(x, dtype=float)
+    rng = np.random.default_rng(rng)
+    
+    if paired or y is None:
+        paired = True
+        data = x if y is None else x - np.asarray(y, dtype=float)
+        n_x = n = len(data)
+        n_possible = 2.**n
+        observed = np.mean(data)
+        statistic = lambda signs: signs @ data / n
+    else:
+        y = np.asarray(y, dtype=float)
+        data = np.hstack((x, y))
+        (n_x, n) = (len(x), len(data))
+        n_possible = comb(n, n_x)
+        total = np.sum(data)
+        observed = np.mean(x) - np.mean(y)
+        def statistic(index):
+            sum_x = np.sum(data[index], axis=1)
+            return sum_x/n_x - (total-sum_x)/(n-n_x)
+    
+    # Deviations at least as extreme as observed, with a tolerance for
+    # rounding errors
+    tolerance = 1e-9 * max(1., abs(observed))
+    if alternative == 'two-sided':
+        is_extreme = lambda values: np.abs(values) >= abs(observed)-tolerance
+    elif alternative == 'greater':
+        is_extreme = lambda values: values >= observed-tolerance
+    elif alternative == 'less':
+        is_extreme = lambda values: values <= observed+tolerance
+    else:
+        raise ValueError(f'Unknown alternative: {alternative}')
+    
+    info = {'statistic': observed}
+    
+    if n_possible <= n_permutations:
+        permutations = _all_permutations(n, n_x, paired)
+        num_extreme = np.sum(is_extreme(statistic(permutations)))
+        info.update(n_permutations=len(permutations), exact=True)
+        return (num_extreme/len(permutations), info)
+    
+    (num_extreme, num_done) = (0, 0)
+    while num_done < n_permutations:
+        num = min(batch_size, n_permutations-num_done)
+        permutations = _random_permutations(n, n_x, paired, num, rng)
+        num_extreme += np.sum(is_extreme(statistic(permutations)))
+        num_done += num
+        
+        # Clopper-Pearson interval of the p-value
+        num_other = num_done - num_extreme
+        ci = np.array(
+            [stats.beta.ppf(0.005, num_extreme, num_other+1)
+                if num_extreme > 0 else 0.,
+             stats.beta.ppf(0.995, num_extreme+1, num_other)
+                if num_other > 0 else 1.])
+        if early_stop and (ci[0] > alpha or ci[1] < alpha):
+            break
+    
+    # The observed arrangement counts as one of the permutations
+    p = (num_extreme+1) / (num_done+1)
+    info.update(n_permutations=num_done, exact=False, ci=ci)
+    
+    return (p, info)
+
+
 if __name__ == '__main__':
     p = paired_data()    
     print(f'paired: {p}')
@@ -3,7 +3,10 @@
 - Chi-square test
 - Fisher exact test
 - McNemar's test
-- Cochran's Q test
+- Cochran's Q test, also for large and streamed data
+- Confidence intervals for arrays of proportions
+- Batch analysis of many 2x2 tables
+- Fisher exact test for RxC tables
 """
 
 # author: Thomas Haslwanter, date: Feb-2021
@@ -14,7 +17,11 @@ import scipy.stats as stats
 import pandas as pd
 
 # additional packages
-from statsmodels.sandbox.stats.runs import cochrans_q, mcnemar
+from statsmodels.sandbox.stats.runs import mcnemar
+from scipy import special
+from functools import lru_cache
+from typing import Iterable
+import time
 
 
 def oneProportion() -> float:
@@ -47,6 +54,9 @@ def oneProportion() -> float:
     print('ONE PROPORTION ----------------------------------------')
     print('The confidence interval for the given sample is ' +
             f'{ci[0]:.3f} - {ci[1]:.3f}')
+    for method in ['wald', 'wilson', 'clopper-pearson']:
+        (lower, upper) = proportionCI(numPositive, numTotal, method=method)
+        print(f'{method:>15s}: {lower:.3f} - {upper:.3f}')
     
     return ci
 
@@ -133,12 +143,117 @@ def cochranQ() -> None:
     df = pd.DataFrame(tasks.T, columns = ['Task1', 'Task2', 'Task3'])
     
     # --- >>> START stats <<< ---
-    (Q, pVal) = cochrans_q(df)
+    (Q, pVal) = cochranQ_array(df)
     # --- >>> STOP stats <<< ---
     print('\nCOCHRAN\'S Q ---------------------------------------------------')
     print('Q = {0:5.3f}, p = {1:5.3f}'.format(Q, pVal))
     if pVal < 0.05:
         print("There is a significant difference between the three tasks.")
+
+
+def proportionCI(count: np.ndarray, nobs: np.ndarray, alpha: float=0.05,
+                 method: str='wilson') -> tuple:
+    """Confidence intervals for binomial proportions, for arrays of counts
+
+    Parameters
+    ----------
+    count : number of successes
+    nobs : number of trials (broadcast against "count")
+    alpha : significance level
+    method : 'wald' (normal approximation, clipped to [0, 1]), 'wilson', or
+             'clopper-pearson' (exact, based on the beta distribution)
+
+    Returns
+    -------
+    lower, upper : limits of the confidence intervals
+    """
+    
+    (count, nobs) = np.broadcast_arrays(np.asarray(count, dtype=float),
+                                        np.asarray(nobs, dtype=float))
+    z = stats.norm.isf(alpha/2)
+    
+    if method == 'wald':
+        p = count/nobs
+        half_width = z*np.sqrt(p*(1-p)/nobs)
+        (lower, upper) = (np.maximum(p - half_width, 0),
+                          np.minimum(p + half_width, 1))
+    elif method == 'wilson':
+        center = (count + z**2/2) / (nobs + z**2)
+        half_width = z/(nobs + z**2) * np.sqrt(count*(nobs-count)/nobs +
+                                               z**2/4)
+        (lower, upper) = (center - half_width, center + half_width)
+    elif method == 'clopper-pearson':
+        with np.errstate(invalid='ignore'):
+            lower = np.where(count > 0,
+                    stats.beta.ppf(alpha/2, count, nobs-count+1), 0.)
+            upper = np.where(count < nobs,
+                    stats.beta.isf(alpha/2, count+1, nobs-count), 1.)
+    else:
+        raise ValueError(f'Unknown method: {method}')
+    
+    return (lower, upper)
+
+
+def cochranQ_stream(chunks: Iterable[np.ndarray]) -> tuple:
+    """Cochran's Q test, for binary data that arrive in blocks of subjects
+
+    Only the number of successes per task, and the sum of the squared
+    numbers of successes per subject are accumulated.
+
+    Parameters
+    ----------
+    chunks : binary data (1 for success), shape (..., n_subjects, n_tasks).
+             All blocks must have the same number of tasks; leading axes
+             correspond to independent tests.
+
+    Returns
+    -------
+    Q : Cochran's Q statistic
+    p : p-value
+    """
+    
+    (col_successes, sum_sq_rows) = (0., 0.)
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=float)
+        col_successes = col_successes + np.sum(chunk, axis=-2)
+        sum_sq_rows = sum_sq_rows + np.sum(np.sum(chunk, axis=-1)**2,
+                                           axis=-1)
+    
+    k = np.shape(col_successes)[-1]
+    total = np.sum(col_successes, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Q = (k-1) * (k*np.sum(col_successes**2, axis=-1) - total**2) / \
+            (k*total - sum_sq_rows)
+    
+    return (Q, stats.chi2.sf(Q, k-1))
+
+
+def cochranQ_array(data: np.ndarray, chunk_size: int=None) -> tuple:
+    """Cochran's Q test, for a subjects-by-tasks matrix of binary data. The
+    subjects are processed in blocks, so "data" can also be a np.memmap that
+    is larger than the memory.
+
+    Parameters
+    ----------
+    data : binary data (1 for success), shape (..., n_subjects, n_tasks)
+    chunk_size : number of subjects per block [default: all at once for
+                 in-memory data, 2**16 for memory-mapped data]
+
+    Returns
+    -------
+    Q : Cochran's Q statistic
+    p : p-value
+    """
+    
+    if not isinstance(data, np.memmap):
+        data = np.asarray(data)
+    n_subjects = data.shape[-2]
+    if chunk_size is None:
+        chunk_size = 2**16 if isinstance(data, np.memmap) \
+                     else max(n_subjects, 1)
+    
+    return cochranQ_stream(data[..., start:start+chunk_size, :]
+                           for start in range(0, n_subjects, chunk_size))
     
 
 def tryMcnemar() -> None:
@@ -163,10 +278,497 @@ def tryMcnemar() -> None:
         print("There was a significant change in the disease by the treatment.")    
     
 
+def _as_tables(tables: np.ndarray) -> np.ndarray:
+    """Check the input, and return the tables as float array (N, 2, 2)"""
+    
+    tables = np.asarray(tables, dtype=float)
+    if tables.ndim == 2:
+        tables = tables[np.newaxis]
+    if tables.shape[1:] != (2, 2):
+        raise ValueError(f'Expected tables of shape (N, 2, 2), got {tables.shape}')
+    return tables
+
+
+def chiSquare_tables(tables: np.ndarray, correction: bool=True) -> tuple:
+    """Chi-square test for many 2x2 tables at once (as
+    "stats.chi2_contingency")
+
+    Parameters
+    ----------
+    tables : observed counts, shape (N, 2, 2)
+    correction : if True, Yates' continuity correction is applied
+
+    Returns
+    -------
+    chi2 : chi-square statistics, shape (N,)
+    p : p-values; NaN for tables with an empty row or column
+    """
+    
+    tables = _as_tables(tables)
+    total = np.sum(tables, axis=(1, 2), keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = np.sum(tables, axis=2, keepdims=True) * \
+                   np.sum(tables, axis=1, keepdims=True) / total
+        
+        deviation = np.abs(tables - expected)
+        if correction:
+            deviation -= np.minimum(0.5, deviation)
+        
+        chi2 = np.sum(deviation**2 / expected, axis=(1, 2))
+    
+    return (chi2, stats.chi2.sf(chi2, 1))
+
+
+def mcnemar_tables(tables: np.ndarray, exact: bool=True,
+                   correction: bool=True) -> tuple:
+    """McNemar's test for many 2x2 tables of paired data at once (as
+    "statsmodels.stats.contingency_tables.mcnemar")
+
+    Parameters
+    ----------
+    tables : observed counts, shape (N, 2, 2)
+    exact : if True, the binomial distribution of the discordant pairs is
+            used; otherwise the chi-square approximation
+    correction : continuity correction for the chi-square approximation
+
+    Returns
+    -------
+    statistic : min(b, c) for the exact test, chi-square statistic otherwise
+    p : p-values
+    """
+    
+    tables = _as_tables(tables)
+    (b, c) = (tables[:, 0, 1], tables[:, 1, 0])
+    
+    if exact:
+        statistic = np.minimum(b, c)
+        p = np.minimum(1, 2*stats.binom.cdf(statistic, b+c, 0.5))
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            statistic = (np.abs(b-c) - correction)**2 / (b+c)
+        p = stats.chi2.sf(statistic, 1)
+    
+    return (statistic, p)
+
+
+def oddsRatio_tables(tables: np.ndarray, alpha: float=0.05) -> tuple:
+    """Sample odds ratios, with Woolf's (log) confidence intervals
+
+    Parameters
+    ----------
+    tables : observed counts, shape (N, 2, 2)
+    alpha : significance level for the confidence intervals
+
+    Returns
+    -------
+    odds_ratio : a*d/(b*c), shape (N,)
+    ci : confidence intervals, shape (N, 2); NaN if a cell is empty
+    """
+    
+    tables = _as_tables(tables)
+    (a, b, c, d) = tables.reshape(-1, 4).T
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        odds_ratio = (a*d) / (b*c)
+        se = np.sqrt(1/a + 1/b + 1/c + 1/d)
+        z = stats.norm.isf(alpha/2)
+        ci = np.exp(np.log(odds_ratio)[:, np.newaxis] +
+                    np.outer(se, [-z, z]))
+    ci[~np.isfinite(se)] = np.nan
+    
+    return (odds_ratio, ci)
+
+
+@lru_cache(maxsize=2**16)
+def _fisher_pvalues(total: int, row: int, col: int,
+                    alternative: str) -> tuple:
+    """p-values of Fisher's exact test, for every possible upper-left count
+    of a 2x2 table with the given margins
+
+    Parameters
+    ----------
+    total : total number of counts
+    row : sum of the first row
+    col : sum of the first column
+    alternative : 'two-sided', 'less', or 'greater'
+
+    Returns
+    -------
+    x_min : smallest possible upper-left count
+    p : p-values for x_min, x_min+1, ..., min(row, col)
+    """
+    
+    x_min = max(0, row + col - total)
+    x = np.arange(x_min, min(row, col) + 1)
+    
+    # hypergeometric log-pmf, from the margins
+    log_pmf = (special.gammaln(row+1) - special.gammaln(x+1) -
+               special.gammaln(row-x+1) + special.gammaln(total-row+1) -
+               special.gammaln(col-x+1) - special.gammaln(total-row-col+x+1) -
+               special.gammaln(total+1) + special.gammaln(col+1) +
+               special.gammaln(total-col+1))
+    pmf = np.exp(log_pmf)
+    
+    if alternative == 'less':
+        p = np.cumsum(pmf)
+    elif alternative == 'greater':
+        p = np.cumsum(pmf[::-1])[::-1]
+    elif alternative == 'two-sided':
+        # sum of all outcomes that are at most as likely as the observed one
+        order = np.sort(pmf)
+        num = np.searchsorted(order, pmf*(1+1e-7), side='right')
+        p = np.cumsum(order)[num-1]
+    else:
+        raise ValueError(f'Unknown alternative: {alternative}')
+    
+    p = np.minimum(p, 1)
+    p.flags.writeable = False
+    return (x_min, p)
+
+
+def fisherExact_tables(tables: np.ndarray,
+                       alternative: str='two-sided') -> np.ndarray:
+    """Fisher's exact test for many 2x2 tables at once (as
+    "stats.fisher_exact"). The p-values for all tables with the same margins
+    are computed only once, and cached across calls.
+
+    Parameters
+    ----------
+    tables : observed counts, shape (N, 2, 2)
+    alternative : 'two-sided', 'less', or 'greater'
+
+    Returns
+    -------
+    p : p-values, shape (N,)
+    """
+    
+    tables = _as_tables(tables).astype(int)
+    x = tables[:, 0, 0]
+    row = tables[:, 0, :].sum(axis=1)
+    col = tables[:, :, 0].sum(axis=1)
+    total = tables.sum(axis=(1, 2))
+    
+    # the distribution is symmetric in the row- and column-margins
+    margins = np.column_stack((total, np.minimum(row, col),
+                               np.maximum(row, col)))
+    (unique, inverse) = np.unique(margins, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    
+    # one lookup-table for all margins, indexed by offset + (x - x_min)
+    lookup = [_fisher_pvalues(n, r, c, alternative)
+              for (n, r, c) in unique.tolist()]
+    x_min = np.array([entry[0] for entry in lookup])
+    offset = np.cumsum([0] + [len(entry[1]) for entry in lookup[:-1]])
+    p_all = np.concatenate([entry[1] for entry in lookup])
+    
+    return p_all[offset[inverse] + x - x_min[inverse]]
+
+
+def analyze_tables(tables: np.ndarray, alpha: float=0.05) -> pd.DataFrame:
+    """Chi-square (with and without Yates' correction), Fisher's exact test,
+    McNemar's test, and odds ratios for many 2x2 tables.
+
+    Parameters
+    ----------
+    tables : observed counts, shape (N, 2, 2)
+    alpha : significance level for the odds-ratio confidence intervals
+
+    Returns
+    -------
+    results : one row per table
+    """
+    
+    tables = _as_tables(tables)
+    results = pd.DataFrame()
+    (results['chi2'], results['p_chi2']) = \
+        chiSquare_tables(tables, correction=False)
+    (results['chi2_yates'], results['p_chi2_yates']) = \
+        chiSquare_tables(tables, correction=True)
+    results['p_fisher'] = fisherExact_tables(tables)
+    results['p_mcnemar'] = mcnemar_tables(tables)[1]
+    (odds_ratio, ci) = oddsRatio_tables(tables, alpha)
+    results['odds_ratio'] = odds_ratio
+    (results['or_lower'], results['or_upper']) = ci.T
+    
+    return results
+
+
+def _column_fillings(rows: np.ndarray, total: int) -> np.ndarray:
+    """All possible entries of the next column, for the remaining row sums
+    "rows" and the column sum "total"
+
+    Returns
+    -------
+    fillings : shape (n_fillings, len(rows))
+    """
+    
+    fillings = np.zeros((1, 0), dtype=int)
+    partial = np.zeros(1, dtype=int)
+    capacity = np.append(np.cumsum(rows[::-1])[::-1], 0)
+    
+    # add the rows one by one, with all values that remain feasible
+    for (ii, row) in enumerate(rows):
+        low = np.maximum(0, total - partial - capacity[ii+1])
+        high = np.minimum(row, total - partial)
+        counts = np.maximum(high - low + 1, 0)
+        index = np.repeat(np.arange(len(partial)), counts)
+        values = np.arange(np.sum(counts)) + \
+                 np.repeat(low - np.cumsum(counts) + counts, counts)
+        fillings = np.column_stack((fillings[index], values))
+        partial = partial[index] + values
+    
+    return fillings
+
+
+def _fisher_network(table: np.ndarray, max_paths: int) -> tuple:
+    """p-value of Fisher's exact test for an RxC table, with the network
+    algorithm of Mehta & Patel (1983).
+
+    The columns of the table are filled in one after the other. A node of the
+    network is characterized by the column and by the (sorted) remaining row
+    sums, and carries the distinct log-probabilities of the paths leading to
+    it. With bounds on the remaining paths, a path can often be counted (or
+    dropped) as a whole, without enumerating the tables it leads to. The last
+    two columns are summed up directly.
+
+    Returns
+    -------
+    p : p-value, or None if more than "max_paths" paths would be needed
+    num_paths : number of evaluated paths
+    """
+    
+    # fewer rows than columns keep the nodes small
+    if table.shape[0] > table.shape[1]:
+        table = table.T
+    rows = np.sum(table, axis=1)
+    # small columns first keep the early stages of the network narrow
+    cols = np.sort(np.sum(table, axis=0))
+    total = int(np.sum(table))
+    log_fact = special.gammaln(np.arange(total+2) + 1)
+    
+    # everything relative to the weights prod(1/n_ij!)
+    constant = np.sum(log_fact[rows]) + np.sum(log_fact[cols]) - \
+               log_fact[total]
+    threshold = -np.sum(log_fact[table]) + np.log1p(1e-7)
+    
+    # nodes are identified by their remaining row sums, as integer code
+    radix = (np.max(rows)+1) ** np.arange(len(rows), dtype=np.int64)
+    if np.log(np.max(rows)+1) * len(rows) > np.log(2.**62):
+        return (None, 0)
+    
+    p = 0.
+    num_paths = 0
+    (codes, past, multiplicity) = (np.sort(rows) @ radix, np.zeros(1),
+                                   np.ones(1))
+    for column in range(len(cols) - 1):
+        # merge the paths with the same node and the same past probability
+        (codes, node_index) = np.unique(codes, return_inverse=True)
+        nodes = codes[:, np.newaxis] // radix % (np.max(rows)+1)
+        node_index = node_index.ravel()
+        rounded = np.round(past, 9)
+        order = np.lexsort((rounded, node_index))
+        (node_index, rounded) = (node_index[order], rounded[order])
+        start = np.flatnonzero(np.r_[True, (np.diff(node_index) != 0) |
+                                           (np.diff(rounded) != 0)])
+        (node_index, past) = (node_index[start], rounded[start])
+        multiplicity = np.add.reduceat(multiplicity[order], start)
+        
+        # log of the sum, largest and smallest weight of the paths from each
+        # node to the end of the network
+        remaining = cols[column:]
+        sum_log_rows = np.sum(log_fact[nodes], axis=1)
+        sum_log_cols = np.sum(log_fact[remaining])
+        log_sum = log_fact[np.sum(nodes, axis=1)] - sum_log_rows - \
+                  sum_log_cols
+        # relaxed problems: only row sums, or only column sums
+        (size, larger) = divmod(nodes, len(remaining))
+        even_rows = np.sum((len(remaining)-larger)*log_fact[size] +
+                           larger*log_fact[size+1], axis=1)
+        num_filled = np.sum(nodes > 0, axis=1)[:, np.newaxis]
+        (size, larger) = divmod(remaining, num_filled)
+        even_cols = np.sum((num_filled-larger)*log_fact[size] +
+                           larger*log_fact[size+1], axis=1)
+        longest = -np.maximum(even_rows, even_cols)
+        shortest = -np.minimum(sum_log_rows, sum_log_cols)
+        
+        complete = past + longest[node_index] <= threshold
+        p += np.sum(multiplicity[complete] *
+                    np.exp(past[complete] + log_sum[node_index[complete]] +
+                           constant))
+        
+        undecided = ~complete & (past + shortest[node_index] <= threshold)
+        (node_index, past, multiplicity) = (node_index[undecided],
+                                  past[undecided], multiplicity[undecided])
+        if len(past) == 0:
+            break
+        
+        # expand the remaining paths by all possible entries of the column
+        (next_codes, next_past, next_multiplicity) = ([], [], [])
+        bounds = np.flatnonzero(np.r_[True, np.diff(node_index) != 0,
+                                      True])
+        for (first, last) in zip(bounds[:-1], bounds[1:]):
+            key = nodes[node_index[first]]
+            fillings = _column_fillings(key, cols[column])
+            weight = -np.sum(log_fact[fillings], axis=1)
+            (node_past, node_multiplicity) = (past[first:last],
+                                              multiplicity[first:last])
+            
+            if column == len(cols) - 2:
+                # the last column is determined by the filling
+                weight -= np.sum(log_fact[key - fillings], axis=1)
+                weight = np.sort(weight)
+                cumulative = np.cumsum(np.exp(weight - weight[-1]))
+                num = np.searchsorted(weight, threshold - node_past,
+                                      side='right')
+                selected = num > 0
+                p += np.sum(node_multiplicity[selected] *
+                            cumulative[num[selected]-1] *
+                            np.exp(node_past[selected] + weight[-1] +
+                                   constant))
+            else:
+                num_paths += len(fillings) * len(node_past)
+                if num_paths > max_paths:
+                    return (None, num_paths)
+                next_codes.append(np.repeat(
+                    np.sort(key - fillings, axis=1) @ radix, len(node_past)))
+                next_past.append((weight[:, np.newaxis] + node_past).ravel())
+                next_multiplicity.append(np.tile(node_multiplicity,
+                                                 len(fillings)))
+        
+        if not next_codes:
+            break
+        (codes, past, multiplicity) = (np.concatenate(next_codes),
+                                      np.concatenate(next_past),
+                                      np.concatenate(next_multiplicity))
+    
+    return (min(p, 1.), num_paths)
+
+
+def _fisher_monte_carlo(table: np.ndarray, n_samples: int,
+                        rng: np.random.Generator,
+                        batch_size: int=1000) -> float:
+    """Monte-Carlo p-value of Fisher's exact test for an RxC table. Random
+    tables with the observed margins are obtained by permuting the column
+    labels of the individual observations.
+    """
+    
+    (num_rows, num_cols) = table.shape
+    row_labels = np.repeat(np.arange(num_rows), np.sum(table, axis=1))
+    col_labels = np.repeat(np.arange(num_cols), np.sum(table, axis=0))
+    log_fact = special.gammaln(np.arange(np.sum(table)+1) + 1)
+    threshold = np.sum(log_fact[table]) * (1 - 1e-7)
+    
+    num_extreme = 0
+    for start in range(0, n_samples, batch_size):
+        num = min(batch_size, n_samples-start)
+        cells = row_labels*num_cols + \
+                rng.permuted(np.tile(col_labels, (num, 1)), axis=1)
+        cells += np.arange(num)[:, np.newaxis] * num_rows*num_cols
+        counts = np.bincount(cells.ravel(), minlength=num*num_rows*num_cols)
+        # tables at most as probable as the observed one
+        num_extreme += np.sum(
+            np.sum(log_fact[counts].reshape(num, -1), axis=1) >= threshold)
+    
+    # The observed table counts as one of the samples
+    return (num_extreme+1) / (n_samples+1)
+
+
+def fisherExact_rxc(table: np.ndarray, method: str='auto',
+                    max_paths: int=5*10**6, n_samples: int=10000,
+                    rng=None) -> tuple:
+    """Fisher's exact test for RxC contingency tables (Freeman-Halton
+    extension): the p-value is the probability of all tables with the same
+    margins that are at most as probable as the observed one.
+
+    Parameters
+    ----------
+    table : observed counts, shape (R, C)
+    method : 'exact' (network algorithm), 'monte-carlo', or 'auto' (exact,
+             unless this needs more than "max_paths" paths)
+    max_paths : work budget for the exact calculation
+    n_samples : number of random tables for the Monte-Carlo method
+    rng : seed, or numpy random Generator
+
+    Returns
+    -------
+    p : p-value
+    info : dictionary, containing
+        - method : 'exact' or 'monte-carlo'
+        - n_paths : number of evaluated network paths
+        - n_samples : number of random tables (Monte-Carlo only)
+    """
+    
+    table = np.asarray(table)
+    if table.ndim != 2 or np.any(table < 0) or \
+            np.any(table != np.round(table)):
+        raise ValueError('The table must be a 2D array of non-negative counts')
+    
+    # empty rows and columns do not matter
+    table = table[np.sum(table, axis=1) > 0][:, np.sum(table, axis=0) > 0]
+    table = table.astype(int)
+    if min(table.shape) < 2:
+        return (1., {'method': 'exact', 'n_paths': 0})
+    
+    if method not in ('exact', 'monte-carlo', 'auto'):
+        raise ValueError(f'Unknown method: {method}')
+    
+    info = {'n_paths': 0}
+    if method != 'monte-carlo':
+        (p, info['n_paths']) = _fisher_network(
+            table, max_paths if method == 'auto' else np.inf)
+        if p is not None:
+            info['method'] = 'exact'
+            return (p, info)
+    
+    p = _fisher_monte_carlo(table, n_samples, np.random.default_rng(rng))
+    info.update(method='monte-carlo', n_samples=n_samples)
+    
+    return (p, info)
+
+
+def benchmark_fisher_rxc() -> pd.DataFrame:
+    """Timing of the exact and the Monte-Carlo version of "fisherExact_rxc",
+    for a 3x4 table and two 5x5 tables (sparse, and with a total of 300).
+    With the default budget, the last one is evaluated by Monte-Carlo.
+
+    Returns
+    -------
+    results : p-values and durations [sec]
+    """
+    
+    tables = {
+        '3x4, n=200': [[6, 18, 13, 31], [4, 11, 21, 21], [8, 9, 27, 31]],
+        '5x5, n=60': [[4, 0, 1, 1, 0], [3, 4, 2, 0, 2], [3, 3, 3, 0, 2],
+                      [5, 5, 1, 3, 0], [3, 7, 5, 1, 2]],
+        '5x5, n=300': [[9, 6, 8, 3, 3], [10, 10, 7, 5, 6],
+                       [16, 15, 20, 15, 7], [22, 16, 11, 18, 7],
+                       [21, 24, 21, 11, 9]] }
+    
+    results = []
+    for (name, table) in tables.items():
+        for method in ['auto', 'monte-carlo']:
+            t_start = time.perf_counter()
+            (p, info) = fisherExact_rxc(table, method=method, rng=1234)
+            results.append({'table': name, 'method': info['method'],
+                            'p': p, 'n_paths': info['n_paths'],
+                            'time': time.perf_counter() - t_start})
+    
+    results = pd.DataFrame(results)
+    print('\nFISHER RxC ----------------------------------------------------')
+    print(results.round(4).to_string(index=False))
+    
+    return results
+
+
 if __name__ == '__main__':
     oneProportion()
     chiSquare()
     fisherExact()
     tryMcnemar()
     cochranQ()
+    
+    # All the 2x2 tables from above, in one go
+    print('\nBATCH ANALYSIS ------------------------------------------------')
+    tables = [[[32, 118], [17, 127]], [[1, 5], [8, 2]], [[101, 121], [59, 33]]]
+    print(analyze_tables(tables).round(4).to_string())
 
@@ -13,6 +13,9 @@ import sys
 sys.path.append(r'..\Code_Quantlets\Utilities')
 import ISP_mystyle 
 
+sys.path.append(r'..\Code_Quantlets\10_SurvivalAnalysis\survivalAnalysis')
+import ISP_survivalAnalysis
+
 from lifelines.datasets import load_waltons
 from lifelines import KaplanMeierFitter
 from lifelines.statistics import logrank_test
@@ -55,3 +58,7 @@ ISP_mystyle.showData(outFile)
 results = logrank_test(T[ix], T[~ix], event_observed_A=E[ix],
                        event_observed_B=E[~ix])
 results.print_summary()
+
+# The same test, with the native implementation
+(chi2, p, summary) = ISP_survivalAnalysis.logrank(T, E, groups)
+print(f'Native log-rank test: chi2 = {chi2:.2f}, p = {p:.4f}')
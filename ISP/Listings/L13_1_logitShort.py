@@ -15,23 +15,14 @@ challenger_data = np.genfromtxt(inFile, skip_header=1,
 # Eliminate NaNs
 challenger_data = challenger_data[~np.isnan(challenger_data[:, 1])]
 
-# Create a dataframe, with suitable columns for the fit
-df = pd.DataFrame()
-df['temp'] = np.unique(challenger_data[:,0])
-df['failed'] = 0
-df['ok'] = 0
-df['total'] = 0
-df.index = df.temp.values
+# Count the number of starts and failures, for each temperature
+(temps, index) = np.unique(challenger_data[:,0], return_inverse=True)
+total = np.bincount(index)
+failed = np.bincount(index, weights=challenger_data[:,1]==1).astype(int)
 
-# Count the number of starts and failures
-for ii in range(challenger_data.shape[0]):
-    curTemp = challenger_data[ii,0]
-    curVal  = challenger_data[ii,1]
-    df.loc[curTemp,'total'] += 1
-    if curVal == 1:
-        df.loc[curTemp, 'failed'] += 1
-    else:
-        df.loc[curTemp, 'ok'] += 1
+# Create a dataframe, with suitable columns for the fit
+df = pd.DataFrame({'temp': temps, 'failed': failed, 'ok': total-failed,
+                   'total': total}, index=temps)
 
 # fit the model
 
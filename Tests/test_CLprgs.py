@@ -31,6 +31,7 @@ import ISP_distNormal
 import ISP_distContinuous
 import ISP_checkNormality
 import ISP_sampleSize
+import ISP_powerSimulation
 import ISP_oneGroup
 import ISP_twoGroups 
 import ISP_anovaOneway
@@ -39,6 +40,7 @@ import ISP_multipleTesting
 import ISP_anovaTwoway
 import ISP_compGroups
 import ISP_lifelinesDemo
+import ISP_survivalAnalysis
 import ISP_bivariate
 import ISP_fitLine
 import ISP_modelImplementations
@@ -90,16 +92,48 @@ class TestSequenceFunctions(unittest.TestCase):
         self.assertAlmostEqual(F, 3.711335988266943)
         self.assertAlmostEqual(p, 0.043589334959179327)
         
+        data = np.genfromtxt('altman_910.txt', delimiter=',')
+        values = np.column_stack((data[:,0], 2*data[:,0]+1))
+        (F,p) = ISP_anovaOneway.anova_vectorized(values, data[:,1])
+        np.testing.assert_almost_equal(F, 3.711335988266943)
+        np.testing.assert_almost_equal(p, 0.043589334959179327)
+        
         F = ISP_anovaOneway.show_teqf()
         self.assertAlmostEqual(F, 2083.481, places=2)
         
         F = ISP_anovaOneway.anova_statsmodels()         
         self.assertAlmostEqual(F, 933.18460306573411)
+        
+        data = pd.read_csv('galton.csv')
+        results = ISP_anovaOneway.anova_massUnivariate(
+                data[['height', 'father']], data['sex'], chunk_size=1)
+        self.assertAlmostEqual(results['F']['height'], 933.18460306573411)
 
     def test_anovaTwoway(self):
         F = ISP_anovaTwoway.anova_interaction()
         self.assertAlmostEqual(F, 2113.101449275357)
         
+    def test_bayesianMetropolis(self):
+        (temperature, failures) = ISP_bayesianStats.getData()
+        (alpha, beta, info) = ISP_bayesianStats.metropolisSampler(
+                temperature, failures, rng=1234)
+        
+        self.assertEqual(alpha.shape, (16*2500, 1))
+        self.assertTrue(np.all(info['rhat'] < 1.01))
+        self.assertTrue(np.all(info['ess'] > 1000))
+        # posterior mean of beta, from a numerical integration on a grid
+        self.assertAlmostEqual(np.mean(beta), 0.269, places=2)
+        
+        (t, mean_p, p, quantiles) = ISP_bayesianStats.calculateProbability(
+                alpha, beta, temperature, failures)
+        (t, mean_chunked, p_chunked, quantiles_chunked) = \
+            ISP_bayesianStats.calculateProbability(alpha, beta, temperature,
+                                                   failures, chunk_size=3000)
+        self.assertAlmostEqual(mean_p[20], 0.573, places=1)
+        np.testing.assert_allclose(mean_chunked, mean_p)
+        np.testing.assert_allclose(quantiles_chunked, quantiles)
+        np.testing.assert_allclose(p_chunked[-2], p[-2])
+        
     #def test_bayesianStats(self):
         #np.random.seed(1234)
         #(temperature, failures) = C14_2_bayesianStats.getData()    
@@ -120,10 +154,28 @@ class TestSequenceFunctions(unittest.TestCase):
         CI = ISP_bootstrapDemo.calc_bootstrap(data)        
         self.assertAlmostEqual(CI[0], 1.884, places=2)
         
+        for method in ['percentile', 'basic', 'bca']:
+            CI2 = ISP_bootstrapDemo.bootstrap_ci(data, method=method, rng=1)
+            self.assertAlmostEqual(CI2[0], CI[0], places=1)
+        
+        # the same results, regardless of the number of processes
+        serial = ISP_bootstrapDemo.bootstrap_distribution(data, rng=1)
+        parallel = ISP_bootstrapDemo.bootstrap_distribution(data, rng=1,
+                                                            n_jobs=2)
+        np.testing.assert_array_equal(serial, parallel)
+        
     def test_checkNormality(self):
         p = ISP_checkNormality.check_normality()
         self.assertAlmostEqual(p, 0.898966913658)
         
+        data = ISP_checkNormality.generate_data(show_flag=False)
+        pVals = ISP_checkNormality.check_normality(data, show_flag=False)
+        table = ISP_checkNormality.screen_normality(
+                np.column_stack((data, data**3)), n_jobs=2)
+        for test in pVals.index:
+            self.assertAlmostEqual(table[test][0], pVals[test])
+        self.assertLess(table['Omnibus'][1], 0.05)
+        
     def test_compGroups(self):
         ci = ISP_compGroups.oneProportion()
         self.assertAlmostEqual(ci[0], 0.130, places=2)
@@ -134,6 +186,38 @@ class TestSequenceFunctions(unittest.TestCase):
         fisher = ISP_compGroups.fisherExact()
         self.assertAlmostEqual(fisher[1], 0.035, places=2)
         
+        tables = [[[32, 118], [17, 127]], [[1, 5], [8, 2]], [[1, 5], [8, 2]]]
+        results = ISP_compGroups.analyze_tables(tables)
+        self.assertAlmostEqual(results['chi2_yates'][0], chi2[0])
+        self.assertAlmostEqual(results['p_fisher'][1], fisher[1])
+        self.assertEqual(results['p_fisher'][1], results['p_fisher'][2])
+        
+        # for 2x2 tables, the RxC test is the usual Fisher test
+        (p, info) = ISP_compGroups.fisherExact_rxc([[1, 5], [8, 2]])
+        self.assertAlmostEqual(p, fisher[1])
+        self.assertEqual(info['method'], 'exact')
+        
+        table = [[6, 18, 13, 31], [4, 11, 21, 21], [8, 9, 27, 31]]
+        p_exact = ISP_compGroups.fisherExact_rxc(table)[0]
+        p_mc = ISP_compGroups.fisherExact_rxc(table, method='monte-carlo',
+                                              rng=1234)[0]
+        self.assertAlmostEqual(p_exact, 0.1379, places=4)
+        self.assertAlmostEqual(p_mc, p_exact, places=1)
+        
+        tasks = np.array([[0,1,1,0,1,0,0,1,0,0,0,0],
+                          [1,1,1,0,0,1,0,1,1,1,1,1],
+                          [0,0,1,0,0,1,0,0,0,0,0,0]]).T
+        (Q, p) = ISP_compGroups.cochranQ_array(tasks, chunk_size=5)
+        self.assertAlmostEqual(Q, 8.667, places=3)
+        (Q, p) = ISP_compGroups.cochranQ_array(np.stack((tasks, tasks)))
+        self.assertEqual(Q.shape, (2,))
+        
+        (lower, upper) = ISP_compGroups.proportionCI([0, 39, 215], 215,
+                                                     method='clopper-pearson')
+        self.assertEqual(lower[0], 0)
+        self.assertEqual(upper[2], 1)
+        self.assertAlmostEqual(lower[1], 0.132, places=3)
+        
     def test_fitLine(self):
         
         # example data
@@ -150,6 +234,50 @@ class TestSequenceFunctions(unittest.TestCase):
         self.assertAlmostEqual(a,1.09781487777)
         self.assertAlmostEqual(b,0.02196252226)
         
+    def test_fitLine_batch(self):
+        x = np.array([15.3, 10.8, 8.1, 19.5, 7.2, 5.3, 9.3, 11.1, 7.5, 12.2,
+                      6.7, 5.2, 19.0, 15.1, 6.7, 8.6, 4.2, 10.3, 12.5, 16.1, 
+                      13.3, 4.9, 8.8, 9.5])
+        y = np.array([1.76, 1.34, 1.27, 1.47, 1.27, 1.49, 1.31, 1.09, 1.18, 
+                      1.22, 1.25, 1.19, 1.95, 1.28, 1.52, np.nan, 1.12, 1.37, 
+                      1.19, 1.05, 1.32, 1.03, 1.12, 1.70])
+        
+        # NaNs are masked per series, so the rows can share "x"
+        ys = np.vstack((y, 2*y))
+        (a,b,(ci_a, ci_b), ri) = ISP_fitLine.fitLine_batch(x, ys, alpha=0.01)
+        
+        self.assertAlmostEqual(a[0],1.09781487777)
+        self.assertAlmostEqual(b[0],0.02196252226)
+        self.assertAlmostEqual(b[1],2*0.02196252226)
+        self.assertEqual(ri['df'][0], 21)
+        
+        # with only 2 points, the line is exact, but has no residual variance
+        (a,b,(ci_a, ci_b), ri) = ISP_fitLine.fitLine_batch([1, 2, 3],
+                                                          [[1, 3, np.nan]])
+        self.assertAlmostEqual(a[0], -1)
+        self.assertAlmostEqual(b[0], 2)
+        self.assertTrue(np.isnan(ri['se_b'][0]))
+        self.assertTrue(np.all(np.isnan(ci_b)))
+        
+    def test_fitLine_stream(self):
+        x = np.array([15.3, 10.8, 8.1, 19.5, 7.2, 5.3, 9.3, 11.1, 7.5, 12.2,
+                      6.7, 5.2, 19.0, 15.1, 6.7, 8.6, 4.2, 10.3, 12.5, 16.1, 
+                      13.3, 4.9, 8.8, 9.5])
+        y = np.array([1.76, 1.34, 1.27, 1.47, 1.27, 1.49, 1.31, 1.09, 1.18, 
+                      1.22, 1.25, 1.19, 1.95, 1.28, 1.52, np.nan, 1.12, 1.37, 
+                      1.19, 1.05, 1.32, 1.03, 1.12, 1.70])
+        
+        # two "workers", each with a few chunks
+        acc1 = ISP_fitLine.LineFitAccumulator()
+        acc1.update(x[:5], y[:5]).update(x[5:10], y[5:10])
+        acc2 = ISP_fitLine.LineFitAccumulator()
+        acc2.update(x[10:17], y[10:17]).update(x[17:], y[17:])
+        (a,b,(ci_a, ci_b), ri) = acc1.merge(acc2).fit(alpha=0.01)
+        
+        self.assertAlmostEqual(a,1.09781487777)
+        self.assertAlmostEqual(b,0.02196252226)
+        self.assertEqual(ri['df'], 21)
+        
     def test_gettingStarted(self):
         ISP_gettingStarted.main()
         
@@ -174,6 +302,27 @@ class TestSequenceFunctions(unittest.TestCase):
         ISP_logisticRegression.showResults(inData, model)
         
         self.assertAlmostEqual(model.params.Intercept, -15.042902, places=5)
+        self.assertEqual(dfFit.total.sum(), len(inData))
+        
+        dfStream = ISP_logisticRegression.prepareForFit_stream(
+                np.array_split(inData, 3))
+        self.assertTrue(dfStream.equals(dfFit))
+        
+        dfTwo = ISP_logisticRegression.prepareForFit(
+                np.column_stack((inData[:, 0], inData[:, 0] > 65,
+                                 inData[:, 1])), names=('temp', 'warm'))
+        self.assertTrue(np.all(dfTwo.failed.values == dfFit.failed.values))
+        
+        X = np.column_stack((np.ones(len(dfFit)), dfFit.temp))
+        (params, bse, info) = ISP_logisticRegression.fitBinomial(
+                X, dfFit.ok, dfFit.total)
+        self.assertTrue(info['converged'])
+        np.testing.assert_allclose(params, model.params.values, rtol=1e-6)
+        np.testing.assert_allclose(bse, model.bse.values, rtol=1e-5)
+        
+        (params, bse, n_iter) = ISP_logisticRegression.fitBinomial_rolling(
+                X, dfFit.ok, dfFit.total, window=len(dfFit))
+        self.assertAlmostEqual(params[0, 0], -15.042902, places=5)
         
     def test_modeling(self):
         F = ISP_simpleModels.model_formulas()
@@ -182,10 +331,42 @@ class TestSequenceFunctions(unittest.TestCase):
         params = ISP_simpleModels.polynomial_regression()
         self.assertAlmostEqual(params[0], 4.74244177)
         
+        from statsmodels.formula.api import ols
+        rng = np.random.default_rng(25)
+        df = pd.DataFrame({'store': np.repeat([1, 2, 3], 40),
+                           'sex': rng.choice(['F', 'M'], 120),
+                           'year': rng.uniform(1900, 2000, 120)})
+        df['time'] = 400 - 0.15*df['year'] + rng.normal(size=120)
+        (coefs, fits) = ISP_simpleModels.ols_by_group('time ~ sex + year',
+                                                      df, group='store')
+        res = ols('time ~ sex + year', df[df['store']==2]).fit()
+        np.testing.assert_allclose(coefs.loc[2, 'coef'], res.params)
+        np.testing.assert_allclose(coefs.loc[2, 'std err'], res.bse)
+        self.assertAlmostEqual(fits.loc[2, 'F'], res.fvalue)
+        
+    def test_modelImplementations(self):
+        x = np.arange(100)
+        y = 150 + 3*x + 0.03*x**2 + 5*np.random.randn(len(x))
+        M = np.vander(x, 4, increasing=True)
+        (params, bse, anova) = ISP_modelImplementations.nestedFits(M, y,
+                                                          n_params=(2, 3, 4))
+        for (k, p) in zip((2, 3, 4), params):
+            np.testing.assert_allclose(p, np.linalg.lstsq(M[:,:k], y)[0])
+        self.assertAlmostEqual(anova['ssr'][2],
+                               np.sum((y - M @ params[2])**2))
+        
     def test_multipleTesting(self):
         var = ISP_multipleTesting.main()
         self.assertAlmostEqual(var,-4.0249223594996213)
         
+        data = ISP_multipleTesting.setData()
+        summary = ISP_multipleTesting.group_summary(data['StressReduction'],
+                                                    data['Treatment'])
+        pairs = ISP_multipleTesting.all_pairs(summary)
+        # same as "pairwise_tukeyhsd"
+        self.assertAlmostEqual(pairs['p_tukey'][0], 0.0106, places=4)
+        self.assertAlmostEqual(pairs['lower'][0], 0.3215, places=4)
+        
     def test_multivariate(self):
         F = ISP_bivariate.regression_line()    
         self.assertAlmostEqual(F, 4.4140184331462571)
@@ -193,6 +374,22 @@ class TestSequenceFunctions(unittest.TestCase):
         pearson = ISP_bivariate.correlation()
         self.assertAlmostEqual(pearson, 0.79208623217849117)
         
+        data = np.random.default_rng(12).integers(0, 10, (200, 4))
+        for method in ['pearson', 'spearman', 'kendall']:
+            corr = ISP_bivariate.correlation_matrix(data, method=method,
+                                                   block_size=3, n_jobs=2)
+            expected = pd.DataFrame(data).corr(method=method).values
+            np.testing.assert_allclose(corr, expected)
+            
+        acc1 = ISP_bivariate.CorrelationAccumulator()
+        acc1.update(data[:50]).update(data[50:120])
+        acc2 = ISP_bivariate.CorrelationAccumulator().update(data[120:])
+        (r, p) = acc1.merge(acc2).pearson()
+        from scipy import stats
+        (r_ref, p_ref) = stats.pearsonr(data[:,0], data[:,1])
+        self.assertAlmostEqual(r[0,1], r_ref)
+        self.assertAlmostEqual(p[0,1], p_ref)
+        
     def test_multipleRegression(self):
         ISP_multipleRegression.scatterplot()
         (X,Y,Z) = ISP_multipleRegression.generateData()
@@ -202,10 +399,27 @@ class TestSequenceFunctions(unittest.TestCase):
         bestfit2 = ISP_multipleRegression.linearModel(X,Y,Z)        
         self.assertAlmostEqual(bestfit2[0][0], -4.99754526)
         
+        chunks = ISP_multipleRegression.pointChunks(X,Y,Z, chunk_size=1000)
+        (params, bse, table, info) = \
+                ISP_multipleRegression.chunkedRegression(chunks)
+        np.testing.assert_allclose(params, bestfit1)
+        self.assertAlmostEqual(table['Std.Err.']['x'], 0.0034053408)
+        self.assertEqual(info['n'], len(Z))
+        
     def test_ologit(self):
         out = ISP_ordinalLogisticRegression.main()
         self.assertAlmostEqual(out, 3.557932263814617, places=5)
         
+    def test_ologit_parallel(self):
+        (X, y) = ISP_ordinalLogisticRegression.get_data()
+        models = ISP_ordinalLogisticRegression.compare_models(X, y)
+        (models_parallel, scores) = \
+            ISP_ordinalLogisticRegression.compare_models_parallel(X, y,
+                                                                 n_jobs=2)
+        self.assertEqual(len(scores), 3*len(models[0].scores))
+        for (model, model_parallel) in zip(models, models_parallel):
+            np.testing.assert_allclose(model.scores, model_parallel.scores)
+        
     def test_oneSample(self):
         p = ISP_oneGroup.check_mean()
         self.assertAlmostEqual(p, 0.018137235176105802)
@@ -227,6 +441,49 @@ class TestSequenceFunctions(unittest.TestCase):
         n2 = ISP_sampleSize.sampleSize_twoGroups(0.4, sigma1=0.6, sigma2=0.6)
         self.assertEqual(n2, 35)
         
+        ns = ISP_sampleSize.sampleSize_twoGroups_grid([0.2, 0.4],
+                    beta=[0.1, 0.2, 0.3], sigma1=0.6, sigma2=0.6, grid=True)
+        self.assertEqual(ns.shape, (2, 3))
+        self.assertEqual(ns[1, 1], 35)
+        
+        power = ISP_sampleSize.power_oneGroup(n1, 0.5)
+        self.assertAlmostEqual(power, 0.8, places=2)
+        
+    def test_powerSimulation(self):
+        # without an effect, the power is the significance level
+        power = ISP_powerSimulation.simulate_power('mannwhitney', [20],
+                    shift=0, max_sims=4000, ci_halfwidth=0, rng=1234)
+        self.assertAlmostEqual(power['power'][20], 0.05, places=2)
+        
+        power = ISP_powerSimulation.simulate_power('chi2', [20, 40, 80],
+                    probs=[0.3, 0.6], ci_halfwidth=0.02, rng=1234)
+        self.assertTrue(np.all(np.diff(power['power']) > 0))
+        self.assertTrue(np.all(power['ci_high'] - power['ci_low'] < 0.04))
+        
+        # the simulations of parallel workers stay within "max_sims"
+        power = ISP_powerSimulation.simulate_power('mannwhitney', [10, 20],
+                    shift=0.5, max_sims=1003, ci_halfwidth=0, n_jobs=3,
+                    rng=1234)
+        self.assertTrue(np.all(power['n_sims'] <= 1003))
+        
+    def test_survivalAnalysis(self):
+        (times, observed, groups) = ISP_survivalAnalysis.simulate_cohort(
+                10**5, rng=1234)
+        km = ISP_survivalAnalysis.kaplan_meier(times, observed, groups)
+        
+        # exponential survival, with mean subscription times of 18 and 3
+        for (group, scale) in [(0, 18), (1, 3)]:
+            curve = km[km.group == group]
+            self.assertEqual(curve.at_risk.iloc[0], np.sum(groups == group))
+            survival = curve.survival.values[curve.time.values <= 6][-1]
+            self.assertAlmostEqual(survival, np.exp(-6/scale), places=2)
+        
+        # without a difference between the groups
+        (chi2, p, summary) = ISP_survivalAnalysis.logrank(
+                times, observed, np.arange(len(times)) % 3)
+        self.assertGreater(p, 0.01)
+        self.assertAlmostEqual(summary.observed.sum(), np.sum(observed))
+        
     def test_twoSample(self):
         p1 = ISP_twoGroups.paired_data()
         self.assertAlmostEqual(p1, 0.0033300139117459797) 
@@ -234,6 +491,14 @@ class TestSequenceFunctions(unittest.TestCase):
         p2 = ISP_twoGroups.unpaired_data()
         self.assertAlmostEqual(p2, 0.0021216133858800489)
         
+        # exact sign-flip test: only 2 of the 2**11 sign patterns are
+        # as extreme as the observed one
+        data = np.genfromtxt('altman_93.txt', delimiter=',')
+        p3, info = ISP_twoGroups.permutation_test(data[:,1], data[:,0],
+                                                  paired=True)
+        self.assertTrue(info['exact'])
+        self.assertAlmostEqual(p3, 2/2**11)
+        
     '''
     def test_figROC(self):
         fig_roc.main()